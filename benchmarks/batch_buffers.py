@@ -0,0 +1,88 @@
+"""
+Compare the memory traffic of the ASR feature path with and without reused batch buffers.
+
+    python -m benchmarks.batch_buffers --batch-size 8 --batches 20
+
+Both paths turn the same synthetic VAD chunks (5-30s of noise) into a batch of log-Mel
+features the way FasterWhisperPipeline feeds the model:
+
+    fresh   pad every chunk, compute its spectrogram, stack the batch (the previous path)
+    reused  copy chunks into a BatchBuffer and compute the spectrograms in place
+
+tracemalloc reports the Python and NumPy allocations of each batch after a warm-up batch.
+Tensor memory comes from torch's own allocator and is invisible to tracemalloc, so the number
+of audio and feature tensors each path creates is listed as well; both still allocate the
+STFT intermediates of every chunk.
+"""
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import torch
+
+from whisper.asr import BatchBuffer
+from whisper.audio import N_SAMPLES, SAMPLE_RATE, log_mel_spectrogram
+
+def synthetic_chunks(count, seed=0):
+    rng = np.random.default_rng(seed)
+    audio = rng.standard_normal(count * N_SAMPLES, dtype=np.float32) * 0.1
+    lengths = rng.integers(5 * SAMPLE_RATE, N_SAMPLES + 1, size=count)
+    # chunks are views of one recording, like the slices transcribe() takes
+    return [audio[i * N_SAMPLES:i * N_SAMPLES + length] for i, length in enumerate(lengths)]
+
+def fresh_batch(chunks):
+    return torch.stack([log_mel_spectrogram(chunk, padding=N_SAMPLES - chunk.shape[0]) for chunk in chunks])
+
+def measure(make_batch, batches):
+    """Seconds per batch and tracemalloc peak/net bytes per batch, after one warm-up batch"""
+    make_batch(batches[0])
+    times, peaks, nets = [], [], []
+    tracemalloc.start()
+    try:
+        for chunks in batches:
+            current, _ = tracemalloc.get_traced_memory()
+            tracemalloc.reset_peak()
+            start = time.perf_counter()
+            features = make_batch(chunks)
+            # what the model receives, see faster_whisper.transcribe.get_ctranslate2_storage
+            array = np.ascontiguousarray(features)
+            times.append(time.perf_counter() - start)
+            after, peak = tracemalloc.get_traced_memory()
+            peaks.append(peak - current)
+            nets.append(after - current)
+            del features, array
+    finally:
+        tracemalloc.stop()
+    return float(np.mean(times)), float(np.mean(peaks)), float(np.mean(nets))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batches", type=int, default=10)
+    parser.add_argument("--threads", type=int, default=None, help="torch threads")
+    args = parser.parse_args()
+    if args.threads:
+        torch.set_num_threads(args.threads)
+
+    chunks = synthetic_chunks(args.batch_size * args.batches)
+    batches = [chunks[i:i + args.batch_size] for i in range(0, len(chunks), args.batch_size)]
+    buffer = BatchBuffer(args.batch_size)
+
+    reference = fresh_batch(batches[0])
+    reused = buffer.fill(batches[0])
+    print(f"max feature difference {float((reference - reused).abs().max()):.2e}, "
+          f"model input shares the buffer: {np.shares_memory(np.ascontiguousarray(reused), buffer.features.numpy())}")
+
+    batch_bytes = reference.element_size() * reference.nelement()
+    print(f"{args.batches} batches of {args.batch_size} chunks, features {batch_bytes / 2 ** 20:.1f} MiB per batch")
+    for name, make_batch, new_tensors in (
+        ("fresh", fresh_batch, f"{2 * args.batch_size + 1} (padded audio and spectrogram per chunk, the stacked batch)"),
+        ("reused", buffer.fill, "none besides the STFT intermediates of each chunk"),
+    ):
+        seconds, peak, net = measure(make_batch, batches)
+        print(f"{name:>7}: {seconds * 1000:8.1f}ms/batch  tracemalloc peak {peak / 1024:8.1f} KiB  "
+              f"net {net / 1024:8.1f} KiB  new tensors: {new_tensors}")
+
+if __name__ == "__main__":
+    main()
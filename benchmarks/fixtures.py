@@ -0,0 +1,92 @@
+"""
+Deterministic fixtures for the benchmarks: generated audio, VAD scores, transcripts and
+speaker turns. The same seed always gives the same data, so runs on one machine compare.
+"""
+import numpy as np
+
+from whisper.audio import SAMPLE_RATE
+
+SYNTHETIC_FIXTURES = ("tones", "speech")
+
+def _utterances(seconds, rng, min_length=1.0, max_length=8.0, min_pause=0.3, max_pause=2.0):
+    """(start, end) sample ranges of alternating sound and silence covering `seconds`"""
+    ranges, t = [], rng.uniform(0.2, 1.0)
+    while t < seconds:
+        end = min(seconds, t + rng.uniform(min_length, max_length))
+        ranges.append((int(t * SAMPLE_RATE), int(end * SAMPLE_RATE)))
+        t = end + rng.uniform(min_pause, max_pause)
+    return ranges
+
+def tones(seconds, seed=0):
+    """Gated sums of two or three sine tones, separated by silence"""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    for start, end in _utterances(seconds, rng):
+        t = np.arange(end - start, dtype=np.float32) / SAMPLE_RATE
+        for frequency in rng.uniform(120.0, 2000.0, size=rng.integers(2, 4)):
+            audio[start:end] += np.sin(2 * np.pi * frequency * t, dtype=np.float32) * 0.1
+    return audio
+
+def speech_like(seconds, seed=0):
+    """Low-passed noise with a 4 Hz syllable envelope in utterances separated by pauses"""
+    rng = np.random.default_rng(seed)
+    audio = np.zeros(int(seconds * SAMPLE_RATE), dtype=np.float32)
+    for start, end in _utterances(seconds, rng):
+        noise = rng.standard_normal(end - start).astype(np.float32)
+        # moving-average low pass, roughly the voice band
+        kernel = np.ones(8, dtype=np.float32) / 8
+        noise = np.convolve(noise, kernel, mode="same")
+        t = np.arange(end - start, dtype=np.float32) / SAMPLE_RATE
+        syllables = 0.5 + 0.5 * np.sin(2 * np.pi * rng.uniform(3.0, 5.0) * t, dtype=np.float32)
+        audio[start:end] = noise * syllables * 0.3
+    return audio
+
+def synthetic_audio(name, seconds, seed=0):
+    if name == "tones":
+        return tones(seconds, seed)
+    if name == "speech":
+        return speech_like(seconds, seed)
+    raise ValueError(f"Unknown fixture: {name}")
+
+def energy_scores(audio, step=0.016875, duration=0.016875):
+    """
+    Speech scores from frame energy as a pyannote SlidingWindowFeature, so merge_chunks can be
+    benchmarked without the VAD model (the step matches pyannote's segmentation frames).
+    """
+    from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+    frame = int(step * SAMPLE_RATE)
+    frames = audio[:len(audio) // frame * frame].reshape(-1, frame)
+    energy = np.log10(np.mean(frames ** 2, axis=1) + 1e-10)
+    scores = np.clip((energy + 6.0) / 4.0, 0.0, 1.0).astype(np.float32)
+    return SlidingWindowFeature(scores[:, None], SlidingWindow(start=0.0, duration=duration, step=step))
+
+def synthetic_result(seconds, segment_seconds=4.0, word_seconds=0.3, seed=0):
+    """A transcription result with word timings, one segment every segment_seconds"""
+    rng = np.random.default_rng(seed)
+    segments, t, index = [], 0.0, 0
+    while t + segment_seconds <= seconds:
+        words, w = [], t
+        while w + word_seconds <= t + segment_seconds:
+            words.append({"word": f"word{index}", "start": round(w, 3), "end": round(w + word_seconds * 0.8, 3),
+                          "score": round(float(rng.uniform(0.5, 1.0)), 3)})
+            w += word_seconds
+            index += 1
+        segments.append({"start": round(t, 3), "end": round(t + segment_seconds, 3),
+                         "text": " ".join(word["word"] for word in words), "words": words})
+        t += segment_seconds
+    return {"segments": segments, "language": "en"}
+
+def synthetic_turns(seconds, num_speakers=4, seed=0):
+    """Diarization turns of 2-10s, with some overlap, as whisper.diarize.SpeakerTurns"""
+    from whisper.diarize import SpeakerTurns
+
+    rng = np.random.default_rng(seed)
+    starts, ends, speaker_ids, t = [], [], [], 0.0
+    while t < seconds:
+        length = rng.uniform(2.0, 10.0)
+        starts.append(t)
+        ends.append(min(seconds, t + length))
+        speaker_ids.append(rng.integers(num_speakers))
+        t += length - rng.uniform(0.0, 0.5)
+    return SpeakerTurns(starts, ends, speaker_ids, [f"SPEAKER_{i:02d}" for i in range(num_speakers)])
@@ -0,0 +1,92 @@
+"""
+Measure how long the app modules take to import, using `python -X importtime`.
+
+    python -m benchmarks.import_time
+    python -m benchmarks.import_time gradio_app --top 30 --budget 2.5
+
+Each module is imported in a fresh interpreter. The report lists the total import time and the
+slowest imports by cumulative time. The run fails (exit status 1) if a module takes longer than
+--budget seconds or pulls in one of the heavy speech packages (torch, faster-whisper,
+ctranslate2, transformers, pyannote), which the apps only import on the first transcription.
+"""
+import argparse
+import json
+import re
+import subprocess
+import sys
+
+DEFAULT_MODULES = ["qt_processing.meeting_summarizer_gui", "gradio_app"]
+HEAVY_MODULES = ["torch", "ctranslate2", "faster_whisper", "transformers", "pyannote"]
+DEFAULT_BUDGET = 3.0
+
+# import time:       253 |        253 |   _io
+IMPORTTIME_RE = re.compile(r"^import time:\s+(\d+)\s+\|\s+(\d+)\s+\|(\s*)(\S+)")
+
+def parse_importtime(stderr):
+    """(module, self seconds, cumulative seconds, nesting depth) per line of -X importtime output"""
+    imports = []
+    for line in stderr.splitlines():
+        match = IMPORTTIME_RE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            imports.append((name, int(self_us) / 1e6, int(cumulative_us) / 1e6, (len(indent) - 1) // 2))
+    return imports
+
+def measure(module, python=sys.executable):
+    """Import a module in a fresh interpreter; returns the parsed imports, or raises on import errors"""
+    result = subprocess.run([python, "-X", "importtime", "-c", f"import {module}"],
+                            capture_output=True, text=True)
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip().splitlines()[-1] if result.stderr.strip() else "import failed")
+    return parse_importtime(result.stderr)
+
+def report(module, imports, top, budget):
+    """Print the report of one module and return its summary with any budget violations"""
+    total = sum(self_seconds for _, self_seconds, _, _ in imports)
+    names = {name for name, _, _, _ in imports}
+    heavy = [name for name in HEAVY_MODULES if name in names]
+
+    print(f"{module}: {total:.3f}s, {len(imports)} modules")
+    # top-level imports only, so a package and its submodules are not counted twice
+    first_level = sorted((entry for entry in imports if entry[3] == 0), key=lambda entry: entry[2], reverse=True)
+    for name, _, cumulative, _ in first_level[:top]:
+        print(f"  {cumulative:8.3f}s  {name}")
+
+    problems = []
+    if total > budget:
+        problems.append(f"import takes {total:.3f}s, budget is {budget:.3f}s")
+    if heavy:
+        problems.append(f"imports heavy packages at startup: {', '.join(heavy)}")
+    for problem in problems:
+        print(f"  FAIL: {problem}")
+    return {"module": module, "seconds": round(total, 4), "modules": len(imports), "heavy": heavy,
+            "slowest": [{"module": name, "seconds": round(cumulative, 4)} for name, _, cumulative, _ in first_level[:top]],
+            "problems": problems}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("modules", nargs="*", default=DEFAULT_MODULES, help="modules to import")
+    parser.add_argument("--top", type=int, default=15, help="number of slowest imports to list")
+    parser.add_argument("--budget", type=float, default=DEFAULT_BUDGET, help="allowed import time in seconds")
+    parser.add_argument("--json", dest="json_path", default=None, help="also write the results to this JSON file")
+    args = parser.parse_args()
+
+    results, failed = [], False
+    for module in args.modules:
+        try:
+            imports = measure(module)
+        except Exception as e:
+            print(f"{module}: cannot be imported ({e})")
+            failed = True
+            continue
+        result = report(module, imports, args.top, args.budget)
+        failed = failed or bool(result["problems"])
+        results.append(result)
+
+    if args.json_path:
+        with open(args.json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,266 @@
+"""
+ASR benchmark suite on fixed fixtures.
+
+    python -m benchmarks.suite
+    python -m benchmarks.suite --seconds 300 --wav meeting.wav --stage transcribe --stage vad
+    python -m benchmarks.suite --output benchmarks/baseline.json      # store a baseline
+
+Every stage runs on generated audio ("tones" and "speech", seeded) and on optional local
+files given with --wav:
+
+    mel                   log-Mel features of 30s chunks through a reused BatchBuffer
+    vad                   VAD scores of the whole recording
+    merge_chunks          merging VAD scores into chunks (model scores, or energy scores without --stage vad)
+    transcribe            FasterWhisperPipeline.transcribe, including its VAD
+    assign_word_speakers  speaker assignment of a synthetic word-timed transcript
+    writers               txt/vtt/srt/tsv/json output of the same transcript
+
+Models are loaded before timing starts. Each stage is timed --repeat times (wall and CPU time,
+real-time factor), then run once more under tracemalloc for its allocations; peak RSS is the
+process high-water mark after the stage. Results are written as JSON and compared against a
+baseline file: a stage whose median wall time grew by more than --tolerance is reported as a
+regression (exit status 1 with --fail-on-regression). A stage that cannot run, e.g. because a
+model cannot be downloaded, is recorded with its error and the suite continues.
+"""
+import argparse
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+from benchmarks.fixtures import (SYNTHETIC_FIXTURES, energy_scores, synthetic_audio, synthetic_result,
+                                 synthetic_turns)
+
+STAGES = ["mel", "vad", "merge_chunks", "transcribe", "assign_word_speakers", "writers"]
+DEFAULT_OUTPUT = os.path.join("benchmarks", "results", "latest.json")
+DEFAULT_BASELINE = os.path.join("benchmarks", "baseline.json")
+WRITER_OPTIONS = {"max_line_width": None, "max_line_count": None, "highlight_words": False}
+
+def peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # kilobytes on Linux, bytes on macOS
+    return peak / 2 ** 20 if sys.platform == "darwin" else peak / 1024
+
+def setup_mel(audio, args, state, models):
+    from whisper.asr import BatchBuffer
+    from whisper.audio import N_SAMPLES
+
+    buffer = BatchBuffer(args.batch_size)
+    chunks = [audio[i:i + N_SAMPLES] for i in range(0, len(audio), N_SAMPLES)]
+
+    def run():
+        for i in range(0, len(chunks), args.batch_size):
+            buffer.fill(chunks[i:i + args.batch_size])
+    return run
+
+def setup_vad(audio, args, state, models):
+    import torch
+    from whisper.audio import SAMPLE_RATE
+    from whisper.vad import load_vad_model
+
+    vad_model = models.get("vad")
+    if vad_model is None:
+        vad_model = models["vad"] = load_vad_model(torch.device(args.device), vad_method=args.vad_method)
+    waveform = {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE}
+
+    def run():
+        state["vad_scores"] = vad_model(waveform)
+    return run
+
+def setup_merge_chunks(audio, args, state, models):
+    from whisper.vad import merge_chunks
+
+    scores = state.get("vad_scores")
+    if scores is None:
+        scores = energy_scores(audio)
+
+    def run():
+        merge_chunks(scores, args.chunk_size)
+    return run
+
+def setup_transcribe(audio, args, state, models):
+    from whisper.asr import load_model
+
+    model = models.get("asr")
+    if model is None:
+        model = models["asr"] = load_model(args.model, args.device, compute_type=args.compute_type,
+                                           language="en", vad_options={"vad_method": args.vad_method},
+                                           download_root="model")
+
+    def run():
+        model.transcribe(audio, batch_size=args.batch_size)
+    return run
+
+def setup_assign_word_speakers(audio, args, state, models):
+    from whisper.audio import SAMPLE_RATE
+    from whisper.diarize import assign_word_speakers
+    from whisper.transcript import Transcript
+
+    seconds = len(audio) / SAMPLE_RATE
+    transcript = Transcript.from_dict(synthetic_result(seconds))
+    turns = synthetic_turns(seconds)
+
+    def run():
+        assign_word_speakers(turns, transcript)
+    return run
+
+def setup_writers(audio, args, state, models):
+    from whisper.audio import SAMPLE_RATE
+    from whisper.utils import get_writer
+
+    result = synthetic_result(len(audio) / SAMPLE_RATE)
+    output_dir = tempfile.mkdtemp(prefix="benchmark-writers-")
+    writer = get_writer("all", output_dir)
+
+    def run():
+        writer(result, "fixture.wav", WRITER_OPTIONS)
+    return run
+
+SETUPS = {
+    "mel": setup_mel,
+    "vad": setup_vad,
+    "merge_chunks": setup_merge_chunks,
+    "transcribe": setup_transcribe,
+    "assign_word_speakers": setup_assign_word_speakers,
+    "writers": setup_writers,
+}
+
+def measure(run, repeat, audio_seconds):
+    """Timing statistics of `repeat` runs, then the allocations of one run under tracemalloc"""
+    walls, cpus = [], []
+    for _ in range(repeat):
+        wall, cpu = time.perf_counter(), time.process_time()
+        run()
+        walls.append(time.perf_counter() - wall)
+        cpus.append(time.process_time() - cpu)
+
+    tracemalloc.start()
+    try:
+        run()
+        current, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    wall = float(np.median(walls))
+    return {
+        "wall_median": round(wall, 6),
+        "wall_min": round(float(np.min(walls)), 6),
+        "cpu_median": round(float(np.median(cpus)), 6),
+        "rtf": round(wall / audio_seconds, 6) if audio_seconds else None,
+        "alloc_peak_mb": round(peak / 2 ** 20, 3),
+        "alloc_retained_mb": round(current / 2 ** 20, 3),
+        "peak_rss_mb": round(peak_rss_mb(), 1),
+    }
+
+def run_fixture(audio, stages, args, models):
+    """
+    Run the stages on one recording. Models in `models` are shared by all fixtures; `state`
+    passes the VAD scores of this recording on to merge_chunks.
+    """
+    from whisper.audio import SAMPLE_RATE
+
+    audio_seconds = len(audio) / SAMPLE_RATE
+    state = {}
+    results = {}
+    for stage in stages:
+        rss_before = peak_rss_mb()
+        try:
+            run = SETUPS[stage](audio, args, state, models)
+            run()  # warm-up
+            results[stage] = measure(run, args.repeat, audio_seconds)
+            results[stage]["peak_rss_growth_mb"] = round(results[stage]["peak_rss_mb"] - rss_before, 1)
+            print(f"  {stage:>20}: {results[stage]['wall_median']:9.3f}s  RTF {results[stage]['rtf']:.4f}  "
+                  f"alloc peak {results[stage]['alloc_peak_mb']:8.1f} MiB  peak RSS {results[stage]['peak_rss_mb']:8.1f} MiB")
+        except Exception as e:
+            results[stage] = {"error": f"{type(e).__name__}: {e}"}
+            print(f"  {stage:>20}: skipped ({results[stage]['error']})")
+    return audio_seconds, results
+
+def compare(results, baseline, tolerance):
+    """Print the change of each stage's median wall time; returns the regressed fixture/stage names"""
+    regressions = []
+    print(f"\nCompared with baseline from {baseline.get('meta', {}).get('time', 'unknown time')}:")
+    for fixture, entry in results["fixtures"].items():
+        reference = baseline.get("fixtures", {}).get(fixture)
+        if reference is None:
+            continue
+        for stage, metrics in entry["stages"].items():
+            old = reference["stages"].get(stage, {}).get("wall_median")
+            new = metrics.get("wall_median")
+            if not old or new is None:
+                continue
+            change = new / old - 1
+            flag = ""
+            if change > tolerance:
+                flag = "  REGRESSION"
+                regressions.append(f"{fixture}/{stage}")
+            print(f"  {fixture}/{stage}: {old:.3f}s -> {new:.3f}s ({change * 100:+.1f}%){flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--stage", action="append", choices=STAGES, help="stages to run (default: all)")
+    parser.add_argument("--fixture", action="append", choices=SYNTHETIC_FIXTURES,
+                        help="generated fixtures to run (default: all)")
+    parser.add_argument("--wav", action="append", default=[], help="also run on this audio file")
+    parser.add_argument("--seconds", type=float, default=120.0, help="length of the generated fixtures")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3, help="timed runs per stage")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--model", default="tiny", help="Whisper model of the transcribe stage")
+    parser.add_argument("--compute-type", default="int8")
+    parser.add_argument("--vad-method", default="pyannote", choices=["pyannote", "silero"])
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--chunk-size", type=int, default=30)
+    parser.add_argument("--output", default=DEFAULT_OUTPUT, help="JSON file for the results")
+    parser.add_argument("--baseline", default=DEFAULT_BASELINE, help="results to compare against, if the file exists")
+    parser.add_argument("--tolerance", type=float, default=0.2, help="allowed relative slowdown per stage")
+    parser.add_argument("--fail-on-regression", action="store_true")
+    args = parser.parse_args()
+
+    from whisper.audio import SAMPLE_RATE, load_audio
+
+    stages = args.stage or STAGES
+    fixtures = [(name, lambda name=name: synthetic_audio(name, args.seconds, args.seed))
+                for name in (args.fixture or SYNTHETIC_FIXTURES)]
+    fixtures += [(os.path.basename(path), lambda path=path: load_audio(path)) for path in args.wav]
+
+    results = {
+        "meta": {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "args": vars(args),
+        },
+        "fixtures": {},
+    }
+    models = {}
+    for name, load in fixtures:
+        audio = load()
+        print(f"{name} ({len(audio) / SAMPLE_RATE:.1f}s):")
+        audio_seconds, stage_results = run_fixture(audio, stages, args, models)
+        results["fixtures"][name] = {"audio_seconds": round(audio_seconds, 3), "stages": stage_results}
+
+    os.makedirs(os.path.dirname(args.output) or ".", exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f"\nResults saved to {args.output}")
+
+    regressions = []
+    if args.baseline and os.path.exists(args.baseline) and os.path.abspath(args.baseline) != os.path.abspath(args.output):
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+    if regressions:
+        print(f"{len(regressions)} stage(s) slower than the baseline: {', '.join(regressions)}")
+        if args.fail_on_regression:
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
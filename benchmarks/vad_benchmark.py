@@ -0,0 +1,88 @@
+"""
+Compare the pyannote and silero VAD backends on the same audio file.
+
+    python -m benchmarks.vad_benchmark path/to/audio.wav --threads 4 --batch-size 32
+
+Reports the scoring time and real-time factor of each backend and how well the
+speech regions produced by `merge_chunks` agree (frame agreement and speech IoU).
+With --workers N the windowed process-pool VAD is also checked against the
+monolithic pyannote run: chunk boundaries should match within one frame.
+"""
+import argparse
+import time
+
+import numpy as np
+import torch
+
+from whisper.audio import SAMPLE_RATE, load_audio
+from whisper.vad import load_vad_model, merge_chunks
+
+FRAME_SECONDS = 0.01
+
+def speech_mask(chunks, num_frames):
+    """Rasterize the speech regions of merged chunks onto a 10ms frame grid"""
+    mask = np.zeros(num_frames, dtype=bool)
+    for chunk in chunks:
+        for start, end in chunk["segments"]:
+            mask[int(start / FRAME_SECONDS):int(np.ceil(end / FRAME_SECONDS))] = True
+    return mask
+
+def run_backend(audio, method, device, chunk_size, **vad_options):
+    vad_model = load_vad_model(torch.device(device), vad_method=method, **vad_options)
+    waveform = {"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE}
+
+    start = time.perf_counter()
+    scores = vad_model(waveform)
+    elapsed = time.perf_counter() - start
+    return elapsed, merge_chunks(scores, chunk_size)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("audio", help="audio or video file to run VAD on")
+    parser.add_argument("--device", default="cpu")
+    parser.add_argument("--chunk-size", type=int, default=30)
+    parser.add_argument("--batch-size", type=int, default=32, help="pyannote sliding windows per forward pass")
+    parser.add_argument("--step", type=float, default=None, help="pyannote sliding window step in seconds")
+    parser.add_argument("--threads", type=int, default=None, help="torch threads used while scoring")
+    parser.add_argument("--workers", type=int, default=None, help="also run the windowed VAD with this many processes")
+    parser.add_argument("--window", type=float, default=600.0, help="window length in seconds for --workers")
+    args = parser.parse_args()
+
+    audio = load_audio(args.audio)
+    audio_seconds = audio.shape[0] / SAMPLE_RATE
+    num_frames = int(np.ceil(audio_seconds / FRAME_SECONDS))
+
+    results = {}
+    for method, options in (
+        ("pyannote", {"vad_batch_size": args.batch_size, "vad_step": args.step}),
+        ("silero", {}),
+    ):
+        elapsed, chunks = run_backend(audio, method, args.device, args.chunk_size,
+                                      vad_num_threads=args.threads, **options)
+        results[method] = speech_mask(chunks, num_frames)
+        print(f"{method:>8}: {elapsed:8.2f}s  RTF {elapsed / audio_seconds:.4f}  "
+              f"{len(chunks)} chunks  speech {results[method].mean() * 100:.1f}%")
+
+    reference, candidate = results["pyannote"], results["silero"]
+    agreement = (reference == candidate).mean()
+    union = (reference | candidate).sum()
+    iou = (reference & candidate).sum() / union if union else 1.0
+    print(f"frame agreement {agreement * 100:.2f}%  speech IoU {iou * 100:.2f}%")
+
+    if args.workers:
+        _, monolithic = run_backend(audio, "pyannote", args.device, args.chunk_size,
+                                    vad_batch_size=args.batch_size, vad_step=args.step, vad_num_threads=args.threads)
+        elapsed, windowed = run_backend(audio, "pyannote", args.device, args.chunk_size,
+                                        vad_batch_size=args.batch_size, vad_step=args.step, vad_num_threads=args.threads,
+                                        vad_num_workers=args.workers, vad_window=args.window)
+        print(f"windowed: {elapsed:8.2f}s  RTF {elapsed / audio_seconds:.4f}  {len(windowed)} chunks "
+              f"({args.workers} workers)")
+        if len(windowed) != len(monolithic):
+            print(f"chunk count differs: {len(windowed)} vs {len(monolithic)}")
+        else:
+            drift = max((max(abs(a["start"] - b["start"]), abs(a["end"] - b["end"]))
+                         for a, b in zip(monolithic, windowed)), default=0.0)
+            print(f"max chunk boundary difference {drift * 1000:.1f}ms")
+
+if __name__ == "__main__":
+    main()
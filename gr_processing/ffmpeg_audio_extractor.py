@@ -1,6 +1,9 @@
 import subprocess
 import re
 
+from whisper.metrics import current_span, timed
+
+@timed("extract_audio")
 def extract_audio_from_video(video_file, audio_file, progress_callback=None):
     """
     Extracts audio from a video file using ffmpeg and reports progress.
@@ -16,6 +19,7 @@ def extract_audio_from_video(video_file, audio_file, progress_callback=None):
     """
     # Get the total duration of the video for progress calculation
     total_duration = get_video_duration(video_file)
+    current_span().add(audio_seconds=total_duration)
 
     command = [
         'ffmpeg',
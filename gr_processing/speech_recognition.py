@@ -1,6 +1,6 @@
-from whisper.asr import load_model
+from summary.glossary import load_glossary, glossary_to_hotwords
 
-def run_speech_recognition(audio_file, whisper_arch, language, cuda_available, progress_callback=None, status_callback=None):
+def run_speech_recognition(audio_file, whisper_arch, language, cuda_available, progress_callback=None, status_callback=None, glossary_path=None, hf_token=None):
     """
     Function to run speech recognition on an audio file with progress and status updates.
     
@@ -13,10 +13,18 @@ def run_speech_recognition(audio_file, whisper_arch, language, cuda_available, p
             The function should accept a single argument, an integer between 0 and 100.
         status_callback (function, optional): A function to call with status updates.
             The function should accept a single string argument representing the current status.
+        glossary_path (str, optional): Path to a glossary file whose terms are used as ASR hotwords.
+        hf_token (str, optional): Hugging Face token; if given, speaker diarization runs alongside transcription.
     
     Returns:
-        dict: Transcription result.
+        dict: Transcription result (a whisper.transcript.Transcript when diarized).
     """
+    # imported on first use, the speech stack takes seconds to import
+    from whisper.asr import load_model
+    from whisper.audio import load_audio
+    from whisper.diarize import get_diarization_pipeline, split_thread_budget, transcribe_and_diarize
+    from whisper.speaker_index import SpeakerIndex
+
     device = "cuda" if cuda_available else "cpu"
 
     # Notify about model download.
@@ -26,7 +34,14 @@ def run_speech_recognition(audio_file, whisper_arch, language, cuda_available, p
         status_callback("Model downloading...")
 
     # Load the model and notify progress.
-    model = load_model(whisper_arch=whisper_arch, device=device, language=language, download_root="model")
+    asr_threads, diarization_threads = 0, None
+    if hf_token and device == "cpu":
+        asr_threads, diarization_threads = split_thread_budget()
+    hotwords = glossary_to_hotwords(load_glossary(glossary_path))
+    model = load_model(whisper_arch=whisper_arch, device=device, language=language,
+                       asr_options={"hotwords": hotwords} if hotwords else None,
+                       vad_options={"vad_cache_dir": "model/vad_cache"}, download_root="model",
+                       cpu_threads=asr_threads)
 
     # Notify that model download is complete.
     if progress_callback:
@@ -48,12 +63,25 @@ def run_speech_recognition(audio_file, whisper_arch, language, cuda_available, p
         if status_callback:
             status_callback(f"Transcribing... ")
 
-    transcription_result = model.transcribe(
-        audio=audio_file,
-        batch_size=1,
-        print_progress=True,
-        progress_callback=internal_progress_callback
-    )
+    if hf_token:
+        # Transcribe and diarize concurrently on the same decoded audio.
+        diarize_model = get_diarization_pipeline(use_auth_token=hf_token, device=device, cache_dir="model")
+        transcription_result = transcribe_and_diarize(
+            model,
+            diarize_model,
+            load_audio(audio_file),
+            batch_size=1,
+            diarization_threads=diarization_threads,
+            speaker_index=SpeakerIndex(),
+            asr_progress_callback=internal_progress_callback
+        )
+    else:
+        transcription_result = model.transcribe(
+            audio=audio_file,
+            batch_size=1,
+            print_progress=True,
+            progress_callback=internal_progress_callback
+        )
     
     # Notify that transcription is complete.
     if progress_callback:
@@ -1,6 +1,56 @@
-from summary.ollama_bot import load_segments_from_json, summarize_meeting, save_summary_to_markdown
+import os
 
-def generate_summary(transcription_file, model, language, prompt_path, output_file):
+from summary.ollama_bot import (load_segments_from_json, stream_summary, stream_summary_to_markdown, summarize_prompts,
+                                summary_markdown_path, save_summary_to_markdown)
+from summary.glossary import load_glossary, glossary_to_prompt_text
+from summary.trace import tracer_for_job
+
+def stream_generate_summary(transcription_file, model, language, prompt_path, output_file, glossary_path=None, stats=None,
+                            refresh=False, speaker_labels=False):
+    """
+    Generate a summary from the transcription, yielding the summary text generated so far.
+
+    The Markdown file is replaced once the summary is complete. If a dict is passed as `stats`, it receives
+    time-to-first-token and tokens/sec once the summary is complete ("cached" if it came from the
+    summary cache). With refresh, a cached summary is regenerated. With speaker_labels, transcript
+    lines are prefixed with their speaker.
+    """
+    segments = load_segments_from_json(transcription_file)
+    if not segments:
+        raise ValueError("Failed to load transcription result.")
+
+    gpt_dict_raw_text = glossary_to_prompt_text(load_glossary(glossary_path))
+    stats = {} if stats is None else stats
+    summary = ""
+    pieces = stream_summary(segments, model, gpt_dict_raw_text, prompt_path, stats=stats, refresh=refresh,
+                            tracer=tracer_for_job(os.path.dirname(output_file)), speaker_labels=speaker_labels)
+    for piece in stream_summary_to_markdown(pieces, output_file, stats):
+        summary += piece
+        yield summary
+
+def generate_all_summaries(transcription_file, model, prompt_paths, output_dir, glossary_path=None, refresh=False,
+                           speaker_labels=False):
+    """
+    Generate one summary per prompt, yielding (prompt_path, summary, output_file) as each completes.
+
+    The requests share the meeting text as a common prefix; see summarize_prompts. Failed
+    summaries are yielded with summary and output_file set to None.
+    """
+    segments = load_segments_from_json(transcription_file)
+    if not segments:
+        raise ValueError("Failed to load transcription result.")
+
+    gpt_dict_raw_text = glossary_to_prompt_text(load_glossary(glossary_path))
+    for prompt_path, summary in summarize_prompts(segments, model, gpt_dict_raw_text, prompt_paths, refresh=refresh,
+                                                  tracer=tracer_for_job(output_dir), speaker_labels=speaker_labels):
+        if summary is None:
+            yield prompt_path, None, None
+            continue
+        output_file = summary_markdown_path(output_dir, prompt_path)
+        save_summary_to_markdown(summary, output_file)
+        yield prompt_path, summary, output_file
+
+def generate_summary(transcription_file, model, language, prompt_path, output_file, glossary_path=None):
     """
     Function to generate a summary from the transcription.
     
@@ -10,16 +60,12 @@ def generate_summary(transcription_file, model, language, prompt_path, output_fi
         language (str): Language for summarization.
         prompt_path (str): Path to the prompt file.
         output_file (str): Path to save the summary.
+        glossary_path (str, optional): Path to a glossary file added to the summary prompt.
     
     Returns:
         str: Path to the summary file.
     """
-    segments = load_segments_from_json(transcription_file)
-    if not segments:
-        raise ValueError("Failed to load transcription result.")
-
-    # Generate the summary
-    meeting_summary = summarize_meeting(segments, model, " ", prompt_path)
-    save_summary_to_markdown(meeting_summary, output_file)
+    for _ in stream_generate_summary(transcription_file, model, language, prompt_path, output_file, glossary_path):
+        pass
     
     return output_file
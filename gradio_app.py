@@ -1,16 +1,16 @@
 import gradio as gr
 import shutil
-import torch
 import os
 import json
 
 from gr_processing.ffmpeg_audio_extractor import extract_audio_from_video
 from gr_processing.speech_recognition import run_speech_recognition
-from gr_processing.summary_thread import generate_summary
-from summary.ollama_bot import populate_sum_model
-
-torch.backends.cuda.matmul.allow_tf32 = False
-torch.backends.cudnn.allow_tf32 = False
+from gr_processing.summary_thread import stream_generate_summary, generate_all_summaries
+from summary.model_list import load_cached_models, merge_model_choices, refresh_models_in_background
+from summary.glossary import list_glossaries, glossary_path_from_name, NO_GLOSSARY
+from whisper.metrics import finish_job, iterate_in_job, start_job, use_job
+from whisper.runtime import cuda_available, preload_diarization_pipeline
+from whisper.transcript import as_dict, npz_path, save_transcript
 
 LANGUAGE_MAP = {
     "日本語": "ja",
@@ -23,10 +23,16 @@ def save_transcription_with_speakers(transcription_result, video_name, output_fi
     os.makedirs(output_dir, exist_ok=True)
     file_path = os.path.join(output_dir, output_file)
     with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(transcription_result, f, ensure_ascii=False, indent=4)
+        json.dump(as_dict(transcription_result), f, ensure_ascii=False, indent=4)
+    save_transcript(transcription_result, npz_path(file_path))
     return file_path
 
-def speech2text(video_file, whisper_model_name, source_language, progress=gr.Progress()):
+def preload_diarization(hf_token):
+    """Load the diarization pipeline in the background as soon as a token is available."""
+    if hf_token and hf_token.strip():
+        preload_diarization_pipeline(use_auth_token=hf_token.strip(), cache_dir="model")
+
+def speech2text(video_file, whisper_model_name, source_language, glossary_name=NO_GLOSSARY, hf_token="", progress=gr.Progress()):
     if not video_file:
         return "No video selected", None
 
@@ -37,6 +43,8 @@ def speech2text(video_file, whisper_model_name, source_language, progress=gr.Pro
 
     status_message = "Starting transcription..."
     transcription_file = None
+    job = start_job(os.path.join("result", video_name), "speech2text")
+    error = None
 
     try:
         def status_callback(status):
@@ -52,23 +60,27 @@ def speech2text(video_file, whisper_model_name, source_language, progress=gr.Pro
         current_progress = 0
         # Update status to indicate audio extraction
         status_callback("Extracting audio from video...")
-        extract_audio_from_video(
-            video_file,
-            audio_file,
-            progress_callback=lambda p: progress((p / 100), f"Extracting audio: {p}%")
-        )
+        with use_job(job):
+            extract_audio_from_video(
+                video_file,
+                audio_file,
+                progress_callback=lambda p: progress((p / 100), f"Extracting audio: {p}%")
+            )
 
         # Update status to indicate speech recognition
         status_callback("Running speech recognition...")
         
-        transcription_result = run_speech_recognition(
-            audio_file,
-            whisper_model_name,
-            LANGUAGE_MAP.get(source_language),
-            torch.cuda.is_available(),
-            progress_callback=transcription_progress_callback,
-            status_callback=status_callback
-        )
+        with use_job(job):
+            transcription_result = run_speech_recognition(
+                audio_file,
+                whisper_model_name,
+                LANGUAGE_MAP.get(source_language),
+                cuda_available(),
+                progress_callback=transcription_progress_callback,
+                status_callback=status_callback,
+                glossary_path=glossary_path_from_name(glossary_name),
+                hf_token=hf_token.strip() or None
+            )
 
         # Update status to indicate saving the transcription result
         status_callback("Saving transcription result...")
@@ -81,26 +93,81 @@ def speech2text(video_file, whisper_model_name, source_language, progress=gr.Pro
     except Exception as e:
         status_message = f"Error: {e}"
         progress(0, status_message)
+        error = type(e).__name__
     finally:
         shutil.rmtree(temp_dir)
+        finish_job(job, error)
 
     return status_message, transcription_file
 
-def text_summary(llm_model_name, target_language, selected_prompt, video_file):
+def text_summary(llm_model_name, target_language, selected_prompt, video_file, glossary_name=NO_GLOSSARY, regenerate=False,
+                 speaker_labels=False):
+    """Stream the summary into the preview while it is generated, then offer the Markdown file."""
     if not video_file:
-        return "No video selected", None
+        yield "No video selected", None, ""
+        return
 
     video_name = os.path.splitext(os.path.basename(video_file))[0]
     prompt_path = f"prompt/{LANGUAGE_MAP.get(target_language, 'en')}/{selected_prompt}.json"
     summary_file = os.path.join("result", video_name, "meeting_summary.md")
     transcription_file = os.path.join("result", video_name, "transcription.json")
 
+    summary = ""
+    stats = {}
     try:
         # Generate summary
-        summary_file = generate_summary(transcription_file, llm_model_name, target_language, prompt_path, summary_file)
-        return "Summary generation complete.", summary_file
+        pieces = stream_generate_summary(transcription_file, llm_model_name, target_language, prompt_path, summary_file,
+                                         glossary_path=glossary_path_from_name(glossary_name), stats=stats,
+                                         refresh=regenerate, speaker_labels=speaker_labels)
+        for summary in iterate_in_job(os.path.join("result", video_name), "summary", pieces):
+            yield "Generating summary...", None, summary
+        if not stats:
+            yield "Error: failed to generate summary.", None, summary
+            return
+        if stats.get("cached"):
+            yield "Summary loaded from cache.", summary_file, summary
+            return
+        yield (f"Summary generation complete. First token after {stats['time_to_first_token']:.1f}s, "
+               f"{stats['tokens_per_second']:.1f} tokens/s"), summary_file, summary
     except Exception as e:
-        return f"Error: {e}", None
+        yield f"Error: {e}", None, summary
+
+def text_summary_all(llm_model_name, target_language, selected_prompts, video_file, glossary_name=NO_GLOSSARY,
+                     regenerate=False, speaker_labels=False):
+    """Generate a summary for every selected prompt; the meeting text is sent once as a shared prefix."""
+    if not video_file:
+        yield "No video selected", None, ""
+        return
+    if not selected_prompts:
+        yield "No prompts selected", None, ""
+        return
+
+    video_name = os.path.splitext(os.path.basename(video_file))[0]
+    language = LANGUAGE_MAP.get(target_language, 'en')
+    prompt_paths = [f"prompt/{language}/{prompt}.json" for prompt in selected_prompts]
+    output_dir = os.path.join("result", video_name)
+    transcription_file = os.path.join(output_dir, "transcription.json")
+
+    files, sections, failed = [], [], []
+    try:
+        yield f"Generating {len(prompt_paths)} summaries...", None, ""
+        results = generate_all_summaries(transcription_file, llm_model_name, prompt_paths, output_dir,
+                                         glossary_path=glossary_path_from_name(glossary_name), refresh=regenerate,
+                                         speaker_labels=speaker_labels)
+        for prompt_path, summary, output_file in iterate_in_job(output_dir, "summary", results):
+            prompt_name = os.path.splitext(os.path.basename(prompt_path))[0]
+            if summary is None:
+                failed.append(prompt_name)
+                continue
+            files.append(output_file)
+            sections.append(f"## {prompt_name}\n\n{summary}")
+            yield f"{len(files)}/{len(prompt_paths)} summaries generated...", files, "\n\n".join(sections)
+        status = f"{len(files)}/{len(prompt_paths)} summaries generated."
+        if failed:
+            status += f" Failed: {', '.join(failed)}"
+        yield status, files or None, "\n\n".join(sections)
+    except Exception as e:
+        yield f"Error: {e}", files or None, "\n\n".join(sections)
 
 def load_prompts(target_language):
     """Load prompt names based on the selected language, adding default prompts if available."""
@@ -155,7 +222,12 @@ def load_prompt_content(language, prompt_name):
 
 if __name__ == "__main__":
     whisper_models = ["large-v2", "large-v1", "medium", "small", "base", "tiny"]
-    ollama_models = populate_sum_model() or ["None"]
+    # Start with the last known summary models; the page fills in the current list once it is fetched
+    model_list_refresh = refresh_models_in_background()
+    ollama_models = load_cached_models() or ["None"]
+    glossaries = [NO_GLOSSARY] + list_glossaries()
+    default_hf_token = os.environ.get("HF_TOKEN", "")
+    preload_diarization(default_hf_token)
 
     with gr.Blocks() as iface:
         gr.Markdown("# Video Summarizer")
@@ -169,6 +241,10 @@ if __name__ == "__main__":
                 )
                 whisper_model_input = gr.Dropdown(choices=whisper_models, label="Select a Whisper model", value=whisper_models[0])
                 source_language_input = gr.Dropdown(choices=["English", "日本語", "中文"], label="Source Language", value="English")
+                glossary_input = gr.Dropdown(choices=glossaries, label="Glossary (glossary/*.txt)", value=NO_GLOSSARY)
+                hf_token_input = gr.Textbox(label="(Optional) Hugging Face token for speaker diarization",
+                                            value=default_hf_token, type="password")
+                hf_token_input.blur(fn=preload_diarization, inputs=[hf_token_input])
 
                 transcription_status = gr.Textbox(label="Status", interactive=False)
                 transcription_file = gr.File(label="Download Transcription")
@@ -178,7 +254,7 @@ if __name__ == "__main__":
                 # Speech-to-text step
                 speech2text_button.click(
                     fn=speech2text,
-                    inputs=[video_input, whisper_model_input, source_language_input],
+                    inputs=[video_input, whisper_model_input, source_language_input, glossary_input, hf_token_input],
                     outputs=[transcription_status, transcription_file]
                 )
 
@@ -186,6 +262,14 @@ if __name__ == "__main__":
                 # Generate Summary Module
                 gr.Markdown("## Generate Summary")
                 llm_model_input = gr.Dropdown(choices=ollama_models, label="Select a summarization model", value=ollama_models[0])
+
+                # Replace the cached model list once the background refresh is done
+                def update_summary_models(current_model):
+                    model_list_refresh.join(timeout=30)
+                    model_names, value = merge_model_choices(current_model, load_cached_models() or ["None"])
+                    return gr.update(choices=model_names, value=value)
+
+                iface.load(fn=update_summary_models, inputs=[llm_model_input], outputs=llm_model_input)
                 target_language_input = gr.Dropdown(choices=["English", "日本語", "中文"], label="Target Language", value="English")
                 
                 # Initialize prompt_name_input with no choices, to be loaded dynamically
@@ -210,6 +294,17 @@ if __name__ == "__main__":
                     outputs=prompt_name_input
                 )
 
+                # Prompts used by "Generate All Selected Prompts", all of them by default
+                all_prompts_input = gr.Dropdown(label="Prompts for 'Generate All Selected Prompts'", choices=[],
+                                                multiselect=True)
+
+                def update_all_prompts(language):
+                    prompts = load_prompts(language)
+                    return gr.update(choices=prompts, value=prompts)
+
+                target_language_input.change(fn=update_all_prompts, inputs=[target_language_input], outputs=all_prompts_input)
+                iface.load(fn=update_all_prompts, inputs=[target_language_input], outputs=all_prompts_input)
+
                 # Buttons for creating, editing, and deleting prompts
                 with gr.Row():
                     new_prompt_button = gr.Button("New Prompt")
@@ -223,6 +318,7 @@ if __name__ == "__main__":
 
                 summary_status = gr.Textbox(label="Summary Status", interactive=False)
                 summary_file = gr.File(label="Download Summary")
+                summary_preview = gr.Markdown(label="Summary")
 
                 # Handle creating a new prompt
                 def create_new_prompt(language):
@@ -293,11 +389,23 @@ if __name__ == "__main__":
                 )
 
                 # Summary step
+                regenerate_input = gr.Checkbox(label="Regenerate (ignore cached summary)", value=False)
+                speaker_labels_input = gr.Checkbox(label="Prefix transcript lines with speaker labels", value=False)
                 text_summary_button = gr.Button("Generate Summary")
                 text_summary_button.click(
                     fn=text_summary,
-                    inputs=[llm_model_input, target_language_input, prompt_name_input, video_input],
-                    outputs=[summary_status, summary_file]
+                    inputs=[llm_model_input, target_language_input, prompt_name_input, video_input, glossary_input,
+                            regenerate_input, speaker_labels_input],
+                    outputs=[summary_status, summary_file, summary_preview]
+                )
+
+                summary_files = gr.File(label="Download Summaries", file_count="multiple")
+                text_summary_all_button = gr.Button("Generate All Selected Prompts")
+                text_summary_all_button.click(
+                    fn=text_summary_all,
+                    inputs=[llm_model_input, target_language_input, all_prompts_input, video_input, glossary_input,
+                            regenerate_input, speaker_labels_input],
+                    outputs=[summary_status, summary_files, summary_preview]
                 )
 
     iface.launch()
@@ -2,19 +2,28 @@ import subprocess
 import re
 from PyQt5.QtCore import QThread, pyqtSignal
 
+from whisper.metrics import current_span, timed, use_job
+
 class AudioExtractorThread(QThread):
     """
     Thread to extract audio from a video file using ffmpeg and update progress.
     """
     progress_updated = pyqtSignal(int)
 
-    def __init__(self, video_file, audio_file):
+    def __init__(self, video_file, audio_file, metrics_job=None):
         super().__init__()
         self.video_file = video_file
         self.audio_file = audio_file
+        self.metrics_job = metrics_job  # whisper.metrics job of the transcription, if any
 
     def run(self):
+        with use_job(self.metrics_job):
+            self.extract()
+
+    @timed("extract_audio")
+    def extract(self):
         total_duration = self.get_video_duration(self.video_file)
+        current_span().add(audio_seconds=total_duration)
 
         command = [
             'ffmpeg',
@@ -3,19 +3,19 @@ import shutil
 from PyQt5.QtWidgets import QMainWindow, QFileDialog, QMessageBox
 from PyQt5 import QtCore, QtWidgets
 from PyQt5.QtCore import QUrl
-from PyQt5.QtGui import QDesktopServices
+from PyQt5.QtGui import QDesktopServices, QTextCursor
 from qt_processing.gui import Ui_MainWindow
-import torch
 import json
 
 from .ffmpeg_audio_extractor import AudioExtractorThread
 from .speech_recognition import SpeechRecognitionThread
-from .diarization_thread import DiarizationThread
-from .summary_thread import SummaryThread
-from summary.ollama_bot import populate_sum_model
-
-torch.backends.cuda.matmul.allow_tf32 = False
-torch.backends.cudnn.allow_tf32 = False
+from .summary_thread import SummaryThread, MultiPromptSummaryThread
+from .model_list_thread import ModelListThread
+from summary.model_list import load_cached_models, merge_model_choices
+from whisper.metrics import finish_job, start_job
+from whisper.runtime import preload_diarization_pipeline
+from whisper.transcript import as_dict, npz_path, save_transcript
+from summary.glossary import list_glossaries, glossary_path_from_name, NO_GLOSSARY
 
 LANGUAGE_MAP = {
     "日本語": "ja",
@@ -43,7 +43,8 @@ def save_transcription_with_speakers(transcription_result, output_dir="result/te
     os.makedirs(output_dir, exist_ok=True)
     file_path = os.path.join(output_dir, output_file)
     with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(transcription_result, f, ensure_ascii=False, indent=4)
+        json.dump(as_dict(transcription_result), f, ensure_ascii=False, indent=4)
+    save_transcript(transcription_result, npz_path(file_path))
     print(f"Transcription and speaker information saved to: {file_path}")
 
 class MainWindow(QMainWindow, Ui_MainWindow):
@@ -58,21 +59,46 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         self.video_path.setObjectName("video_path")
         self.video_path.setText("Open video")
 
+        # Per-project glossary used for both ASR hotwords and the summary prompt
+        self.glossary = QtWidgets.QComboBox(self.offline)
+        self.glossary.setGeometry(QtCore.QRect(710, 575, 311, 40))
+        self.glossary.setObjectName("glossary")
+        self.glossary.setToolTip("Glossary (glossary/*.txt)")
+
+        # Summary text, filled while it is generated
+        self.summary_view = QtWidgets.QPlainTextEdit(self.offline)
+        self.summary_view.setGeometry(QtCore.QRect(920, 20, 340, 430))
+        self.summary_view.setObjectName("summary_view")
+        self.summary_view.setReadOnly(True)
+        self.regenerate_summary = QtWidgets.QCheckBox("Regenerate (ignore cached summary)", self.offline)
+        self.regenerate_summary.setGeometry(QtCore.QRect(920, 455, 340, 24))
+        self.regenerate_summary.setObjectName("regenerate_summary")
+        # Summarize with every prompt of the target language in one go
+        self.all_prompts = QtWidgets.QCheckBox("All prompts of the target language", self.offline)
+        self.all_prompts.setGeometry(QtCore.QRect(920, 482, 340, 24))
+        self.all_prompts.setObjectName("all_prompts")
+
         # Connect buttons to methods
         self.video_path.clicked.connect(self.open_file_dialog)
         self.speech2text.clicked.connect(self.start_speech2text)
         self.stop.clicked.connect(self.stop_and_cleanup)
         self.text_summary.clicked.connect(self.start_generate_summary)
         self.prompt_edit.clicked.connect(self.open_prompt_folder)
+        self.tf_token.editingFinished.connect(self.preload_diarization)
 
         self.temp_dir = "temp"
         self.hf_token_flag = True
-        self.cuda_available = torch.cuda.is_available()
-        print(f"CUDA available: {self.cuda_available}")
+        self.metrics_job = None  # whisper.metrics job of the running transcription, if PIPELINE_METRICS is set
 
-        # Populate the sum_model combobox with ollama models
+        # Show the last known summary models at once and refresh them in the background
         self.populate_sum_model()
         self.load_prompts()
+        self.load_glossaries()
+
+        # Optionally preload the diarization pipeline at start from the HF_TOKEN environment variable
+        if os.environ.get("HF_TOKEN"):
+            self.tf_token.setText(os.environ["HF_TOKEN"])
+            self.preload_diarization()
         self.target_language.currentIndexChanged.connect(self.load_prompts)
 
     def load_prompts(self):
@@ -111,6 +137,17 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         else:
             print(f"Prompt folder for {target_language} does not exist.")
 
+    def preload_diarization(self):
+        # Load the diarization pipeline in the background as soon as a token is entered
+        hf_token = self.tf_token.text().strip()
+        if hf_token and hf_token.startswith("hf_"):
+            preload_diarization_pipeline(use_auth_token=hf_token, cache_dir="model")
+
+    def load_glossaries(self):
+        self.glossary.clear()
+        self.glossary.addItem(NO_GLOSSARY)
+        self.glossary.addItems(list_glossaries())
+
     def open_prompt_folder(self):
         # Get the target language and selected prompt filename
         target_language = self.target_language.currentText()
@@ -126,14 +163,28 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             QMessageBox.warning(self, "Folder Not Found", "The prompt folder does not exist or no prompt is selected.")
 
     def populate_sum_model(self):
-        try:
-            model_names = populate_sum_model()
-            if model_names:
-                self.sum_model.addItems(model_names)
-            else:
-                self.sum_model.addItem("Check ollama models")
-        except Exception as e:
-            print(f"Error fetching ollama models: {e}")
+        cached_models = load_cached_models()
+        if cached_models:
+            self.sum_model.addItems(cached_models)
+        else:
+            self.sum_model.addItem("Loading models...")
+
+        self.model_list_thread = ModelListThread()
+        self.model_list_thread.models_loaded.connect(self.update_sum_models)
+        self.model_list_thread.models_failed.connect(self.on_sum_models_failed)
+        self.model_list_thread.start()
+
+    def update_sum_models(self, model_names):
+        model_names, current = merge_model_choices(self.sum_model.currentText(), model_names)
+        self.sum_model.clear()
+        self.sum_model.addItems(model_names)
+        self.sum_model.setCurrentText(current)
+
+    def on_sum_models_failed(self):
+        # Keep the cached list; without one, tell the user to check the model server
+        if not load_cached_models():
+            self.sum_model.clear()
+            self.sum_model.addItem("Check ollama models")
             QMessageBox.warning(self, "Model Load Failed", "Unable to detect ollama models, please check installation.")
 
     def open_file_dialog(self):
@@ -171,12 +222,15 @@ class MainWindow(QMainWindow, Ui_MainWindow):
             return
         self.progressBar.setValue(0)
         self.status.setText("Extracting audio...")
+        # A transcription that never completed is recorded as such
+        finish_job(self.metrics_job, "unfinished")
+        self.metrics_job = start_job(self.output_dir, "speech2text")
 
         if not os.path.exists(self.temp_dir):
             os.makedirs(self.temp_dir)
 
         audio_file = os.path.join(self.temp_dir, "extracted_audio.wav")
-        self.extract_audio_thread = AudioExtractorThread(video_file, audio_file)
+        self.extract_audio_thread = AudioExtractorThread(video_file, audio_file, self.metrics_job)
         self.extract_audio_thread.progress_updated.connect(self.update_progress)
         self.extract_audio_thread.finished.connect(lambda: self.start_speech_recognition(audio_file))
         self.extract_audio_thread.start()
@@ -188,33 +242,33 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         whisper_arch = self.au_model.currentText()
         language = self.source_language.currentText()
 
-        self.speech_recognition_thread = SpeechRecognitionThread(audio_file, whisper_arch, language, self.cuda_available)
+        glossary_path = glossary_path_from_name(self.glossary.currentText())
+        hf_token = self.tf_token.text() if self.hf_token_flag else None
+
+        # the thread picks CUDA or CPU itself, checking imports torch and would block the UI
+        self.speech_recognition_thread = SpeechRecognitionThread(audio_file, whisper_arch, language, glossary_path,
+                                                                 hf_token, self.metrics_job)
         self.speech_recognition_thread.progress_updated.connect(self.update_progress)
         self.speech_recognition_thread.recognition_complete.connect(self.on_recognition_complete)
+        self.speech_recognition_thread.recognition_failed.connect(self.on_recognition_failed)
         self.speech_recognition_thread.status_updated.connect(self.update_status_label)
         self.speech_recognition_thread.start()
 
     def on_recognition_complete(self, transcription_result):
-        hf_token = self.tf_token.text()
-        if not self.hf_token_flag:
+        # With a Hugging Face token the result already carries the diarized speakers
+        if self.hf_token_flag:
+            self.status.setText("Completed! Results saved.")
+        else:
             self.status.setText("Speech transcription complete.")
-            self.save_transcription(transcription_result)
-            self.update_progress(100)
-            return
-
-        self.status.setText("Speaker diarization...")
-        self.progressBar.setValue(0)
-
-        self.diarization_thread = DiarizationThread(self.speech_recognition_thread.audio_file, transcription_result, hf_token, self.cuda_available)
-        self.diarization_thread.progress_updated.connect(self.update_progress)
-        self.diarization_thread.status_updated.connect(self.update_status_label)
-        self.diarization_thread.diarization_complete.connect(self.on_diarization_complete)
-        self.diarization_thread.start()
-
-    def on_diarization_complete(self, final_transcription):
-        self.status.setText("Completed! Results saved.")
-        self.save_transcription(final_transcription)
+        self.save_transcription(transcription_result)
         self.update_progress(100)
+        finish_job(self.metrics_job)
+        self.metrics_job = None
+
+    def on_recognition_failed(self, error):
+        self.status.setText(f"Speech recognition failed: {error}")
+        finish_job(self.metrics_job, type(error).__name__)
+        self.metrics_job = None
 
     def update_progress(self, value):
         self.progressBar.setValue(value)
@@ -237,13 +291,31 @@ class MainWindow(QMainWindow, Ui_MainWindow):
         prompt_folder = os.path.join("prompt", language)
         prompt_path = os.path.join(prompt_folder, f"{selected_prompt}.json")
         output_file = os.path.join(self.output_dir, "meeting_summary.md")
-
-        self.summary_thread = SummaryThread(transcription_file, model, language, prompt_path, output_file)
+        glossary_path = glossary_path_from_name(self.glossary.currentText())
+
+        # Diarized transcripts are summarized with speaker labels in front of each line
+        if self.all_prompts.isChecked():
+            prompt_paths = [os.path.join(prompt_folder, f"{self.prompt.itemText(i)}.json") for i in range(self.prompt.count())]
+            self.summary_thread = MultiPromptSummaryThread(transcription_file, model, prompt_paths, self.output_dir,
+                                                           glossary_path, refresh=self.regenerate_summary.isChecked(),
+                                                           speaker_labels=self.hf_token_flag)
+        else:
+            self.summary_thread = SummaryThread(transcription_file, model, language, prompt_path, output_file, glossary_path,
+                                                refresh=self.regenerate_summary.isChecked(),
+                                                speaker_labels=self.hf_token_flag)
         self.summary_thread.progress_updated.connect(self.update_progress)
         self.summary_thread.status_updated.connect(self.update_status_label)
+        self.summary_thread.token_received.connect(self.append_summary_text)
+        self.summary_view.clear()
         self.summary_thread.start()
+
+    def append_summary_text(self, text):
+        self.summary_view.moveCursor(QTextCursor.End)
+        self.summary_view.insertPlainText(text)
         
     def stop_and_cleanup(self):
+        finish_job(self.metrics_job, "stopped")
+        self.metrics_job = None
         if os.path.exists(self.temp_dir):
             shutil.rmtree(self.temp_dir)
             print(f"Temporary folder {self.temp_dir} deleted.")
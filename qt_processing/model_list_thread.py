@@ -0,0 +1,17 @@
+from PyQt5.QtCore import QThread, pyqtSignal
+
+from summary.model_list import refresh_models
+
+class ModelListThread(QThread):
+    """
+    Thread to fetch the summary backend's model list without blocking the window.
+    """
+    models_loaded = pyqtSignal(list)
+    models_failed = pyqtSignal()
+
+    def run(self):
+        model_names = refresh_models()
+        if model_names:
+            self.models_loaded.emit(model_names)
+        else:
+            self.models_failed.emit()
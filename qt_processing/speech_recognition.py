@@ -1,9 +1,11 @@
 from PyQt5.QtCore import QThread, pyqtSignal
-from whisper.asr import load_model
+from summary.glossary import load_glossary, glossary_to_hotwords
+from whisper.metrics import use_job
 
 class SpeechRecognitionThread(QThread):
     progress_updated = pyqtSignal(int)
-    recognition_complete = pyqtSignal(dict)
+    recognition_complete = pyqtSignal(object)  # result dict, or a whisper.transcript.Transcript when diarized
+    recognition_failed = pyqtSignal(object)  # the exception
     status_updated = pyqtSignal(str)
 
     LANGUAGE_MAP = {
@@ -12,33 +14,84 @@ class SpeechRecognitionThread(QThread):
         "English": "en"
     }
 
-    def __init__(self, audio_file, whisper_arch, language, cuda_available):
+    def __init__(self, audio_file, whisper_arch, language, glossary_path=None, hf_token=None, metrics_job=None):
         super().__init__()
         self.audio_file = audio_file
         self.whisper_arch = whisper_arch
         self.language = self.LANGUAGE_MAP.get(language, "en")
-        self.device = "cuda" if cuda_available else "cpu"
+        self.device = None  # resolved in recognize(), checking for CUDA imports torch
+        self.glossary_path = glossary_path
+        self.hf_token = hf_token  # speaker diarization runs alongside ASR when a token is given
+        self.audio = None  # decoded waveform, shared with the diarization stage
+        self.metrics_job = metrics_job  # whisper.metrics job of the transcription, if any
 
     def run(self):
+        with use_job(self.metrics_job):
+            try:
+                self.recognize()
+            except Exception as e:
+                print(f"Error in speech recognition: {e}")
+                self.recognition_failed.emit(e)
+
+    def recognize(self):
         """
-        Run the speech recognition model and emit progress.
+        Run the speech recognition model (and speaker diarization concurrently) and emit progress.
         """
+        # imported on first use, the speech stack takes seconds to import
+        from whisper.asr import load_model
+        from whisper.audio import load_audio
+        from whisper.diarize import get_diarization_pipeline, split_thread_budget, transcribe_and_diarize
+        from whisper.runtime import default_device
+        from whisper.speaker_index import SpeakerIndex
+
+        self.device = default_device()
         self.status_updated.emit("Model Downloading...")
+        asr_threads, diarization_threads = 0, None
+        if self.hf_token and self.device == "cpu":
+            asr_threads, diarization_threads = split_thread_budget()
+        hotwords = glossary_to_hotwords(load_glossary(self.glossary_path))
         model = load_model(
             whisper_arch=self.whisper_arch,
             device=self.device,
             language=self.language,
-            download_root="model"
+            asr_options={"hotwords": hotwords} if hotwords else None,
+            vad_options={"vad_cache_dir": "model/vad_cache"},
+            download_root="model",
+            cpu_threads=asr_threads
         )
-        self.status_updated.emit("Speech transcription...")
 
         def progress_callback(progress):
             # print(f"Progress: {progress}%")  # Debugging print
             self.progress_updated.emit(int(progress))
 
+        # Decode once, the same buffer is reused for speaker diarization
+        self.audio = load_audio(self.audio_file)
+
+        if self.hf_token:
+            diarize_model = get_diarization_pipeline(use_auth_token=self.hf_token, device=self.device, cache_dir="model")
+
+            def diarization_progress(step_name, step_artifact, file=None, total=None, completed=None):
+                self.status_updated.emit(f"Speech transcription + separation - {step_name}")
+
+            self.status_updated.emit("Speech transcription + speaker diarization...")
+            final_transcription = transcribe_and_diarize(
+                model,
+                diarize_model,
+                self.audio,
+                batch_size=1,
+                diarization_threads=diarization_threads,
+                speaker_index=SpeakerIndex(),
+                asr_progress_callback=progress_callback,
+                diarization_progress_callback=diarization_progress
+            )
+            self.status_updated.emit("Speaker assignment complete.")
+            self.recognition_complete.emit(final_transcription)
+            return
+
+        self.status_updated.emit("Speech transcription...")
         # Transcribe audio and track progress
         transcription_result = model.transcribe(
-            audio=self.audio_file,
+            audio=self.audio,
             batch_size=1,
             print_progress=True,
             progress_callback=progress_callback
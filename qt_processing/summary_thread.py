@@ -1,19 +1,33 @@
-from summary.ollama_bot import load_segments_from_json,summarize_meeting,save_summary_to_markdown
+import os
+from summary.ollama_bot import (load_segments_from_json, stream_summary, stream_summary_to_markdown, summarize_prompts,
+                                summary_markdown_path, save_summary_to_markdown)
+from summary.glossary import load_glossary, glossary_to_prompt_text
+from summary.trace import tracer_for_job
+from whisper.metrics import metrics_job
 from PyQt5 import QtCore
 
 class SummaryThread(QtCore.QThread):
     progress_updated = QtCore.pyqtSignal(int)
     status_updated = QtCore.pyqtSignal(str)
+    token_received = QtCore.pyqtSignal(str)
 
-    def __init__(self, transcription_file, model, language, prompt_path, output_file):
+    def __init__(self, transcription_file, model, language, prompt_path, output_file, glossary_path=None, refresh=False,
+                 speaker_labels=False):
         super().__init__()
         self.transcription_file = transcription_file
         self.model = model
         self.language = language
         self.prompt_path = prompt_path
         self.output_file = output_file
+        self.glossary_path = glossary_path
+        self.refresh = refresh  # regenerate even if the summary cache has this summary
+        self.speaker_labels = speaker_labels  # prefix transcript lines with their speaker
 
     def run(self):
+        with metrics_job(os.path.dirname(self.output_file), "summary"):
+            self.generate()
+
+    def generate(self):
         try:
             segments = load_segments_from_json(self.transcription_file)
             if not segments:
@@ -21,11 +35,73 @@ class SummaryThread(QtCore.QThread):
                 return
 
             self.status_updated.emit("Generating meeting summary...")
-            meeting_summary = summarize_meeting(segments, self.model, " ", self.prompt_path)
-            save_summary_to_markdown(meeting_summary, self.output_file)
+            gpt_dict_raw_text = glossary_to_prompt_text(load_glossary(self.glossary_path))
+            stats = {}
+            pieces = stream_summary(segments, self.model, gpt_dict_raw_text, self.prompt_path, stats=stats,
+                                    refresh=self.refresh, tracer=tracer_for_job(os.path.dirname(self.output_file)),
+                                    speaker_labels=self.speaker_labels)
+            # Tokens are shown and written to the Markdown file as they arrive
+            for count, piece in enumerate(stream_summary_to_markdown(pieces, self.output_file, stats), 1):
+                self.token_received.emit(piece)
+                if count % 20 == 0:
+                    self.status_updated.emit(f"Generating meeting summary... {count} pieces received")
 
-            self.status_updated.emit("Summary generated and saved.")
+            if not stats:
+                self.status_updated.emit("Error generating meeting summary.")
+                return
+            if stats.get("cached"):
+                self.status_updated.emit("Summary loaded from cache and saved.")
+            else:
+                self.status_updated.emit(f"Summary generated and saved. First token after {stats['time_to_first_token']:.1f}s, "
+                                         f"{stats['tokens_per_second']:.1f} tokens/s")
             self.progress_updated.emit(100)
         except Exception as e:
             print(f"Error generating meeting summary: {e}")
             self.status_updated.emit("Error generating meeting summary.")
+
+class MultiPromptSummaryThread(QtCore.QThread):
+    """Generate one summary per prompt file, sharing the meeting text as a common request prefix"""
+    progress_updated = QtCore.pyqtSignal(int)
+    status_updated = QtCore.pyqtSignal(str)
+    token_received = QtCore.pyqtSignal(str)
+
+    def __init__(self, transcription_file, model, prompt_paths, output_dir, glossary_path=None, refresh=False,
+                 speaker_labels=False):
+        super().__init__()
+        self.transcription_file = transcription_file
+        self.model = model
+        self.prompt_paths = prompt_paths
+        self.output_dir = output_dir
+        self.glossary_path = glossary_path
+        self.refresh = refresh
+        self.speaker_labels = speaker_labels
+
+    def run(self):
+        with metrics_job(self.output_dir, "summary"):
+            self.generate()
+
+    def generate(self):
+        try:
+            segments = load_segments_from_json(self.transcription_file)
+            if not segments:
+                self.status_updated.emit("Failed to load transcription result.")
+                return
+
+            self.status_updated.emit(f"Generating {len(self.prompt_paths)} meeting summaries...")
+            gpt_dict_raw_text = glossary_to_prompt_text(load_glossary(self.glossary_path))
+            done = 0
+            for prompt_path, summary in summarize_prompts(segments, self.model, gpt_dict_raw_text, self.prompt_paths,
+                                                          refresh=self.refresh, tracer=tracer_for_job(self.output_dir),
+                                                          speaker_labels=self.speaker_labels):
+                done += 1
+                self.progress_updated.emit(int(done * 100 / len(self.prompt_paths)))
+                prompt_name = os.path.splitext(os.path.basename(prompt_path))[0]
+                if summary is None:
+                    self.status_updated.emit(f"Error generating summary '{prompt_name}'.")
+                    continue
+                save_summary_to_markdown(summary, summary_markdown_path(self.output_dir, prompt_path))
+                self.token_received.emit(f"## {prompt_name}\n\n{summary}\n\n")
+                self.status_updated.emit(f"{done}/{len(self.prompt_paths)} summaries generated and saved.")
+        except Exception as e:
+            print(f"Error generating meeting summaries: {e}")
+            self.status_updated.emit("Error generating meeting summaries.")
@@ -0,0 +1,287 @@
+"""
+LLM backends for summary generation.
+
+Every backend keeps one pooled HTTP client for its lifetime, limits the number of requests in
+flight and retries transient failures. Select one with environment variables:
+
+    SUMMARY_BACKEND=ollama   (default; SUMMARY_BACKEND_URL defaults to OLLAMA_HOST or localhost:11434)
+    SUMMARY_BACKEND=openai   (OpenAI-compatible server, e.g. llama.cpp server or vLLM;
+                              SUMMARY_BACKEND_URL defaults to http://127.0.0.1:8080/v1)
+    SUMMARY_BACKEND=stub     (deterministic answers without a model, for tests)
+
+Answers are plain dicts: {"content": str, "done": bool} plus whatever token counts the server
+reports, under Ollama's names (prompt_eval_count, eval_count, ...).
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+from abc import ABC, abstractmethod
+
+import httpx
+
+DEFAULT_TIMEOUT = 600.0  # generating a long summary can take minutes
+CONNECT_TIMEOUT = 10.0
+DEFAULT_RETRIES = 2
+DEFAULT_MAX_CONCURRENCY = 4
+OPENAI_DEFAULT_URL = "http://127.0.0.1:8080/v1"
+
+class LLMBackend(ABC):
+    """Interface of a summary model server"""
+
+    def __init__(self, retries=DEFAULT_RETRIES, max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        self.retries = retries
+        self.max_concurrency = max_concurrency
+        self._slots = threading.BoundedSemaphore(max_concurrency)
+
+    @abstractmethod
+    def chat(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        """Return the complete answer"""
+
+    @abstractmethod
+    def chat_stream(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        """Yield answer parts; the last one has done=True and the token counts"""
+
+    @abstractmethod
+    def list_models(self):
+        """Names of the models the server offers"""
+
+    def count_tokens(self, model, text):
+        """Exact token count of a text in the model's tokenizer, or None if the server cannot tell"""
+        return None
+
+    def is_retryable(self, error):
+        # ollama raises the builtin ConnectionError for httpx.ConnectError, e.g. while the server starts
+        return isinstance(error, (httpx.TransportError, ConnectionError)) or (
+            isinstance(error, httpx.HTTPStatusError) and error.response.status_code in (429, 502, 503, 504))
+
+    def _call(self, function, *args, **kwargs):
+        """Run one request in a concurrency slot, retrying transient failures with backoff"""
+        with self._slots:
+            for attempt in range(self.retries + 1):
+                try:
+                    return function(*args, **kwargs)
+                except Exception as e:
+                    if attempt == self.retries or not self.is_retryable(e):
+                        raise
+                    print(f"LLM request failed ({e}), retrying...")
+                    time.sleep(2 ** attempt)
+
+    def _stream(self, open_stream):
+        """
+        Yield from a streaming request in a concurrency slot. Transient failures are retried
+        only until the first part arrived, so no part is yielded twice.
+        """
+        with self._slots:
+            for attempt in range(self.retries + 1):
+                started = False
+                try:
+                    for part in open_stream():
+                        started = True
+                        yield part
+                    return
+                except Exception as e:
+                    if started or attempt == self.retries or not self.is_retryable(e):
+                        raise
+                    print(f"LLM request failed ({e}), retrying...")
+                    time.sleep(2 ** attempt)
+
+class OllamaBackend(LLMBackend):
+    """Ollama server, through one ollama.Client (a pooled httpx client) per backend"""
+
+    COUNTS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration")
+
+    def __init__(self, host=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        super().__init__(retries, max_concurrency)
+        # imported here so the other backends work without the ollama package
+        import ollama
+        from ollama._types import Options
+
+        self._ollama = ollama
+        self._Options = Options
+        self.client = ollama.Client(
+            host=host,
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    def is_retryable(self, error):
+        if isinstance(error, self._ollama.ResponseError):
+            return error.status_code in (429, 502, 503, 504)
+        return super().is_retryable(error)
+
+    def _answer(self, response):
+        answer = {"content": response['message']['content'], "done": bool(response.get('done', False))}
+        for name in self.COUNTS:
+            if response.get(name) is not None:
+                answer[name] = response.get(name)
+        return answer
+
+    def _options(self, num_ctx, num_predict):
+        return self._Options(num_ctx=num_ctx, num_predict=num_predict)
+
+    def chat(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        response = self._call(self.client.chat, model=model, messages=messages,
+                              options=self._options(num_ctx, num_predict), keep_alive=keep_alive)
+        return self._answer(response)
+
+    def chat_stream(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        def open_stream():
+            return self.client.chat(model=model, messages=messages, options=self._options(num_ctx, num_predict),
+                                    keep_alive=keep_alive, stream=True)
+
+        for part in self._stream(open_stream):
+            yield self._answer(part)
+
+    def list_models(self):
+        models = self._call(self.client.list)
+        return [model['model'] for model in models['models']] if models and 'models' in models else []
+
+    def count_tokens(self, model, text):
+        # Ollama has no tokenize call; the embed endpoint reports how many tokens it evaluated
+        response = self._call(self.client.embed, model=model, input=text)
+        return response.get('prompt_eval_count')
+
+class OpenAICompatibleBackend(LLMBackend):
+    """OpenAI-style /v1/chat/completions server such as llama.cpp server or vLLM"""
+
+    def __init__(self, base_url=OPENAI_DEFAULT_URL, api_key=None, timeout=DEFAULT_TIMEOUT, retries=DEFAULT_RETRIES,
+                 max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        super().__init__(retries, max_concurrency)
+        self.base_url = base_url.rstrip("/")
+        headers = {"Authorization": f"Bearer {api_key}"} if api_key else {}
+        self.client = httpx.Client(
+            base_url=self.base_url,
+            headers=headers,
+            timeout=httpx.Timeout(timeout, connect=CONNECT_TIMEOUT),
+            limits=httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency)
+        )
+
+    def _payload(self, model, messages, num_predict, stream):
+        # the context size is fixed when such a server starts, so num_ctx is not sent
+        payload = {"model": model, "messages": messages, "stream": stream}
+        if num_predict and num_predict > 0:
+            payload["max_tokens"] = num_predict
+        return payload
+
+    @staticmethod
+    def _counts(usage):
+        if not usage:
+            return {}
+        return {"prompt_eval_count": usage.get("prompt_tokens"), "eval_count": usage.get("completion_tokens")}
+
+    def _request(self, method, url, **kwargs):
+        response = self.client.request(method, url, **kwargs)
+        response.raise_for_status()
+        return response.json()
+
+    def chat(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        data = self._call(self._request, "POST", "/chat/completions",
+                          json=self._payload(model, messages, num_predict, False))
+        choice = data["choices"][0]
+        return {"content": choice["message"].get("content") or "", "done": True, **self._counts(data.get("usage"))}
+
+    def chat_stream(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        payload = self._payload(model, messages, num_predict, True)
+        payload["stream_options"] = {"include_usage": True}
+
+        def open_stream():
+            with self.client.stream("POST", "/chat/completions", json=payload) as response:
+                response.raise_for_status()
+                # server-sent events: "data: {...}" lines, ending with "data: [DONE]"
+                for line in response.iter_lines():
+                    if line.startswith("data:"):
+                        data = line[len("data:"):].strip()
+                        if data == "[DONE]":
+                            return
+                        yield json.loads(data)
+
+        usage = None
+        for event in self._stream(open_stream):
+            usage = event.get("usage") or usage
+            for choice in event.get("choices") or []:
+                content = (choice.get("delta") or {}).get("content")
+                if content:
+                    yield {"content": content, "done": False}
+        yield {"content": "", "done": True, **self._counts(usage)}
+
+    def list_models(self):
+        return [model["id"] for model in self._call(self._request, "GET", "/models").get("data", [])]
+
+    def count_tokens(self, model, text):
+        # llama.cpp server and vLLM both offer /tokenize next to /v1, with different payloads
+        root = self.base_url[:-len("/v1")] if self.base_url.endswith("/v1") else self.base_url
+        try:
+            data = self._call(self._request, "POST", f"{root}/tokenize",
+                              json={"content": text, "model": model, "prompt": text})
+        except Exception:
+            return None
+        if "count" in data:
+            return data["count"]
+        return len(data["tokens"]) if "tokens" in data else None
+
+class StubBackend(LLMBackend):
+    """Deterministic answers derived from the request, without a model; for tests and dry runs"""
+
+    def __init__(self, models=("stub",), max_concurrency=DEFAULT_MAX_CONCURRENCY):
+        super().__init__(0, max_concurrency)
+        self.models = list(models)
+        self.requests = []
+        self._lock = threading.Lock()
+
+    def _reply(self, model, messages):
+        content = messages[-1]["content"]
+        with self._lock:
+            self.requests.append({"model": model, "messages": messages})
+        digest = hashlib.sha1(content.encode("utf-8")).hexdigest()[:8]
+        first_line = content.strip().splitlines()[0][:60] if content.strip() else ""
+        return f"Summary {digest} of {len(content)} characters: {first_line}"
+
+    def chat(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        with self._slots:
+            reply = self._reply(model, messages)
+        return {"content": reply, "done": True, "prompt_eval_count": len(messages[-1]["content"]) // 4,
+                "eval_count": len(reply.split())}
+
+    def chat_stream(self, model, messages, num_ctx, num_predict=-1, keep_alive=None):
+        with self._slots:
+            reply = self._reply(model, messages)
+        words = reply.split(" ")
+        for i, word in enumerate(words):
+            yield {"content": word if i == 0 else " " + word, "done": False}
+        yield {"content": "", "done": True, "prompt_eval_count": len(messages[-1]["content"]) // 4,
+               "eval_count": len(words)}
+
+    def list_models(self):
+        return list(self.models)
+
+_backend = None
+_backend_lock = threading.Lock()
+
+def create_backend(name=None, url=None):
+    """Create the backend named by SUMMARY_BACKEND (ollama, openai or stub) at SUMMARY_BACKEND_URL"""
+    name = (name or os.environ.get("SUMMARY_BACKEND") or "ollama").lower()
+    url = url or os.environ.get("SUMMARY_BACKEND_URL")
+    if name == "ollama":
+        return OllamaBackend(host=url)
+    if name == "openai":
+        return OpenAICompatibleBackend(base_url=url or OPENAI_DEFAULT_URL, api_key=os.environ.get("SUMMARY_API_KEY"))
+    if name == "stub":
+        return StubBackend()
+    raise ValueError(f"Unknown summary backend: {name}")
+
+def get_backend():
+    """The process-wide backend, created on first use, so every request shares one connection pool"""
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            _backend = create_backend()
+        return _backend
+
+def set_backend(backend):
+    """Replace the process-wide backend, e.g. with a StubBackend in tests"""
+    global _backend
+    with _backend_lock:
+        _backend = backend
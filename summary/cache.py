@@ -0,0 +1,119 @@
+"""
+On-disk cache of generated summaries.
+
+Entries are keyed by a hash of everything that determines the answer: transcript text, prompt
+JSON, glossary text, model name and generation options. Least recently used entries are dropped
+once the cache grows beyond its entry or byte limit. Clear it with:
+
+    python -m summary.cache clear
+"""
+import hashlib
+import json
+import os
+import sys
+import tempfile
+import time
+
+SUMMARY_CACHE_DIR = os.path.join("model", "summary_cache")
+MAX_CACHE_ENTRIES = 500
+MAX_CACHE_BYTES = 64 * 1024 * 1024
+
+def summary_cache_key(lines, prompt_data, gpt_dict_raw_text, model, options):
+    """Hash of transcript lines, prompt JSON, glossary text, model name and options"""
+    digest = hashlib.sha256()
+    for line in lines:
+        digest.update(line.encode("utf-8"))
+        digest.update(b"\n")
+    digest.update(b"\0")
+    digest.update(json.dumps([prompt_data, gpt_dict_raw_text, model, options], ensure_ascii=False,
+                             sort_keys=True).encode("utf-8"))
+    return digest.hexdigest()
+
+class SummaryCache:
+    """Summaries stored as one JSON file per key; a hit refreshes the file's mtime for LRU eviction"""
+
+    def __init__(self, cache_dir=SUMMARY_CACHE_DIR, max_entries=MAX_CACHE_ENTRIES, max_bytes=MAX_CACHE_BYTES):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.json")
+
+    def get(self, key):
+        """Return the cached summary for a key, or None"""
+        path = self._path(key)
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                summary = json.load(f)["summary"]
+            os.utime(path)
+            return summary
+        except FileNotFoundError:
+            return None
+        except Exception as e:
+            print(f"Error reading cached summary {path}: {e}")
+            return None
+
+    def put(self, key, summary, **metadata):
+        """Store a summary, then evict least recently used entries beyond the limits"""
+        try:
+            os.makedirs(self.cache_dir, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"summary": summary, "created": time.time(), **metadata}, f, ensure_ascii=False)
+            os.replace(tmp_path, self._path(key))
+            self.evict()
+        except Exception as e:
+            print(f"Error writing summary cache: {e}")
+
+    def invalidate(self, key):
+        """Drop one entry; returns whether it existed"""
+        try:
+            os.remove(self._path(key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def clear(self):
+        """Drop all entries; returns how many were removed"""
+        removed = 0
+        for path, _, _ in self._entries():
+            try:
+                os.remove(path)
+                removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
+
+    def _entries(self):
+        if not os.path.isdir(self.cache_dir):
+            return []
+        entries = []
+        for name in os.listdir(self.cache_dir):
+            if name.endswith(".json"):
+                path = os.path.join(self.cache_dir, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                entries.append((path, stat.st_mtime, stat.st_size))
+        return entries
+
+    def evict(self):
+        entries = sorted(self._entries(), key=lambda entry: entry[1], reverse=True)
+        total = 0
+        for i, (path, _, size) in enumerate(entries):
+            total += size
+            if i >= self.max_entries or total > self.max_bytes:
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+
+summary_cache = SummaryCache()
+
+if __name__ == "__main__":
+    if sys.argv[1:] == ["clear"]:
+        print(f"Removed {summary_cache.clear()} cached summaries from {summary_cache.cache_dir}")
+    else:
+        print(__doc__)
@@ -0,0 +1,53 @@
+import re
+
+# Hiragana, katakana, CJK ideographs, hangul and full-width forms
+CJK_RE = re.compile(r"[぀-ヿ㐀-䶿一-鿿가-힯＀-￯]")
+
+def estimate_tokens(text):
+    """Rough token count of a text: one token per CJK character, four characters per token otherwise"""
+    if not text:
+        return 0
+    cjk = len(CJK_RE.findall(text))
+    return cjk + (len(text) - cjk + 3) // 4
+
+def _split_long_line(line, max_tokens, count=estimate_tokens):
+    """Cut a single line that is over budget into pieces of at most max_tokens"""
+    pieces = []
+    start = 0
+    while start < len(line):
+        # longest piece that fits (the estimate grows with the length), at least one character
+        low, high = start + 1, len(line)
+        while low < high:
+            middle = (low + high + 1) // 2
+            if count(line[start:middle]) <= max_tokens:
+                low = middle
+            else:
+                high = middle - 1
+        pieces.append(line[start:low])
+        start = low
+    return pieces
+
+def chunk_lines(lines, max_tokens, count=estimate_tokens):
+    """
+    Pack consecutive lines into chunks of at most max_tokens each, as counted by `count`.
+
+    Chunks break between lines; a single line longer than the budget is cut into pieces.
+    """
+    chunks = []
+    current, current_tokens = [], 0
+    for line in lines:
+        tokens = count(line) + 1  # + newline
+        if tokens > max_tokens:
+            pieces = _split_long_line(line, max_tokens - 1, count)
+        else:
+            pieces = [line]
+        for piece in pieces:
+            tokens = count(piece) + 1
+            if current and current_tokens + tokens > max_tokens:
+                chunks.append("\n".join(current))
+                current, current_tokens = [], 0
+            current.append(piece)
+            current_tokens += tokens
+    if current:
+        chunks.append("\n".join(current))
+    return chunks
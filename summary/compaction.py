@@ -0,0 +1,135 @@
+"""
+Transcript compaction before summarization.
+
+Merges consecutive segments of the same speaker, drops repeated (often hallucinated) lines and
+filler words, so more of the meeting fits into the model's context and less prompt has to be
+evaluated.
+"""
+import re
+import threading
+
+from summary.backends import get_backend
+from summary.chunking import CJK_RE, estimate_tokens
+
+# Filler words per language; only forms that carry no meaning on their own
+DISFLUENCIES = {
+    "en": re.compile(r"(?<![\w'-])(?:u+h+m*|u+m+|e+r+m*|a+h+|h+m+|m+h*m+|uh-huh)(?![\w'-])[,.]?\s*", re.IGNORECASE),
+    "ja": re.compile(r"(?:えー+と?|ええと|えっと|あのー+|うー+ん|んー+|あー+)[、，,]?"),
+    # 额 and 唔 are also parts of words (金额, 名额), so they only count as a clause of their own
+    "zh": re.compile(r"(?:嗯+|呃+|(?<![^\s，,、。！？])(?:额+|唔+)(?=[\s，,、。！？]|$))[，,、]?"),
+}
+# Stuttered function words, "I I think", "the the" -> "I think", "the" (not "very very", "no no")
+REPEATED_WORD = re.compile(r"\b(i|a|an|the|and|but|so|to|we|you|it|that|is)(?:,?\s+\1\b)+", re.IGNORECASE)
+# A repeated line counts as duplicate if it equals one of this many previous lines of the same speaker
+DEDUP_WINDOW = 3
+KANA_RE = re.compile(r"[぀-ヿ]")
+
+def detect_language(text):
+    """"ja", "zh" or "en" for the filler rules of a line, from the characters it uses"""
+    if KANA_RE.search(text):
+        return "ja"
+    if CJK_RE.search(text):
+        return "zh"
+    return "en"
+
+def _normalize(text):
+    return re.sub(r"[\W_]+", "", text).lower()
+
+def strip_disfluencies(text, language):
+    """Remove filler words (and immediate word repetitions for English) from one line"""
+    pattern = DISFLUENCIES.get(language)
+    if pattern is None:
+        return text.strip()
+    text = pattern.sub("", text)
+    if language == "en":
+        text = REPEATED_WORD.sub(r"\1", text)
+    return re.sub(r"\s{2,}", " ", text).strip()
+
+def compact_transcript(segments, language=None, speaker_labels=False, strip_fillers=True):
+    """
+    Return the transcript as compact lines: one per speaker turn, without repeated lines and fillers.
+
+    language ("en", "ja" or "zh") selects the filler rules; None detects it per segment.
+    With speaker_labels, each line starts with "<speaker>: " if the segment has a speaker.
+    """
+    lines, speakers = [], []
+    recent = []
+    for seg in segments:
+        text = seg.get("text", "")
+        segment_language = language or detect_language(text)
+        if strip_fillers:
+            text = strip_disfluencies(text, segment_language)
+        else:
+            text = text.strip()
+        speaker = seg.get("speaker")
+        key = (speaker, _normalize(text))
+        if not key[1] or key in recent:
+            continue
+        recent = (recent + [key])[-DEDUP_WINDOW:]
+
+        if lines and speaker is not None and speaker == speakers[-1]:
+            lines[-1] += ("" if segment_language in ("ja", "zh") else " ") + text
+        else:
+            lines.append(text)
+            speakers.append(speaker)
+
+    if speaker_labels:
+        return [f"{speaker}: {line}" if speaker is not None else line for speaker, line in zip(speakers, lines)]
+    return lines
+
+class TokenCounter:
+    """
+    Token counts in the target model's tokenizer.
+
+    The character-based estimate is calibrated once per model and script with the backend's exact
+    count of a text sample (for Ollama the embed endpoint's prompt_eval_count). Backends or models
+    that cannot count tokens keep the plain estimate.
+    """
+    SAMPLE_CHARS = 2000
+    # shorter texts are estimated without calibrating on them
+    MIN_SAMPLE_CHARS = 200
+
+    def __init__(self, model, backend=None):
+        self.model = model
+        self.backend = backend
+        self.ratios = {}
+        self._lock = threading.Lock()
+
+    def calibrate(self, sample):
+        sample = sample[:self.SAMPLE_CHARS]
+        estimate = estimate_tokens(sample)
+        if estimate == 0:
+            return 1.0
+        try:
+            tokens = (self.backend or get_backend()).count_tokens(self.model, sample)
+        except Exception as e:
+            print(f"Token count calibration failed, using estimates: {e}")
+            tokens = None
+        return tokens / estimate if tokens else 1.0
+
+    def ratio(self, text):
+        # calibrate separately for mostly CJK and mostly other text
+        script = "cjk" if estimate_tokens(text) > len(text) / 2 else "other"
+        with self._lock:
+            if script not in self.ratios:
+                if len(text) < self.MIN_SAMPLE_CHARS:
+                    return 1.0
+                self.ratios[script] = self.calibrate(text)
+            return self.ratios[script]
+
+    def __call__(self, text):
+        estimate = estimate_tokens(text)
+        if estimate == 0:
+            return 0
+        return int(estimate * self.ratio(text)) + 1
+
+_counters = {}
+_counters_lock = threading.Lock()
+
+def token_counter(model, backend=None):
+    """Shared TokenCounter per model (and backend), so each model is calibrated once per process"""
+    with _counters_lock:
+        key = (model, id(backend) if backend is not None else None)
+        if key not in _counters:
+            _counters[key] = TokenCounter(model, backend)
+        return _counters[key]
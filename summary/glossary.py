@@ -0,0 +1,62 @@
+import os
+from functools import lru_cache
+
+GLOSSARY_DIR = "glossary"
+NO_GLOSSARY = "None"
+
+def list_glossaries(glossary_dir=GLOSSARY_DIR):
+    """Return the names of the glossary files available in the glossary folder"""
+    if not os.path.exists(glossary_dir):
+        return []
+    return sorted(os.path.splitext(f)[0] for f in os.listdir(glossary_dir) if f.endswith(".txt"))
+
+def glossary_path_from_name(name, glossary_dir=GLOSSARY_DIR):
+    """Map a glossary name selected in a GUI to its file path, or None if no glossary is selected"""
+    if not name or name == NO_GLOSSARY:
+        return None
+    return os.path.join(glossary_dir, f"{name}.txt")
+
+@lru_cache(maxsize=16)
+def _parse_glossary(glossary_path, mtime):
+    entries = []
+    with open(glossary_path, "r", encoding="utf-8") as file:
+        for line in file:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            term, _, note = line.partition("=")
+            term = term.strip()
+            if term:
+                entries.append((term, note.strip()))
+    return tuple(entries)
+
+def load_glossary(glossary_path):
+    """
+    Load a per-project glossary file.
+
+    One entry per line, either ``term`` or ``term = explanation``. Empty lines and
+    lines starting with ``#`` are ignored. The parsed entries are cached until the
+    file changes on disk, so every meeting of a series reuses the same result.
+    """
+    if not glossary_path:
+        return ()
+    if not os.path.exists(glossary_path):
+        print(f"Glossary file not found: {glossary_path}")
+        return ()
+
+    try:
+        return _parse_glossary(glossary_path, os.path.getmtime(glossary_path))
+    except Exception as e:
+        print(f"Error reading glossary file: {e}")
+        return ()
+
+def glossary_to_hotwords(entries):
+    """Build the ASR hotwords string (terms only) from glossary entries"""
+    return ", ".join(term for term, _ in entries)
+
+def glossary_to_prompt_text(entries):
+    """Build the glossary block passed to summarize_meeting as gpt_dict_raw_text"""
+    if not entries:
+        return " "
+    lines = [f"- {term}: {note}" if note else f"- {term}" for term, note in entries]
+    return "Glossary of names and terms used in this meeting:\n" + "\n".join(lines)
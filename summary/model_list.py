@@ -0,0 +1,64 @@
+"""
+Summary model discovery that does not block app startup.
+
+The last model list fetched from the summary backend is kept in model/summary_models.json. The
+apps show that list at once and replace it when refresh_models_in_background() has asked the
+backend for the current one.
+"""
+import json
+import os
+import tempfile
+import threading
+
+from summary.ollama_bot import populate_sum_model
+
+MODEL_LIST_CACHE = os.path.join("model", "summary_models.json")
+
+def load_cached_models(path=MODEL_LIST_CACHE):
+    """The last known model names, or an empty list"""
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return [name for name in json.load(f)["models"] if isinstance(name, str)]
+    except FileNotFoundError:
+        return []
+    except Exception as e:
+        print(f"Error reading cached model list {path}: {e}")
+        return []
+
+def save_cached_models(model_names, path=MODEL_LIST_CACHE):
+    try:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path) or ".", suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            json.dump({"models": list(model_names)}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+    except Exception as e:
+        print(f"Error writing cached model list {path}: {e}")
+
+def refresh_models(path=MODEL_LIST_CACHE):
+    """Ask the backend for its models and remember them; None if the backend is unreachable"""
+    model_names = populate_sum_model()
+    if model_names:
+        save_cached_models(model_names, path)
+    return model_names
+
+def refresh_models_in_background(callback=None, path=MODEL_LIST_CACHE):
+    """
+    Run refresh_models in a background thread and return the thread.
+
+    callback, if given, is called from that thread with the fresh model names (None on failure).
+    """
+    def refresh():
+        model_names = refresh_models(path)
+        if callback is not None:
+            callback(model_names)
+
+    thread = threading.Thread(target=refresh, name="summary-model-list", daemon=True)
+    thread.start()
+    return thread
+
+def merge_model_choices(current, model_names):
+    """Choices for a model dropdown and the entry to select, keeping the current selection if possible"""
+    choices = list(model_names)
+    value = current if current in choices else (choices[0] if choices else None)
+    return choices, value
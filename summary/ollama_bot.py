@@ -1,7 +1,14 @@
 import json
-import ollama
 import os
-from ollama._types import Options
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from summary.backends import get_backend
+from summary.cache import summary_cache, summary_cache_key
+from summary.chunking import chunk_lines
+from summary.compaction import compact_transcript, token_counter
+from whisper.metrics import bind_job, span, timed
+from whisper.transcript import load_fresh_transcript
 
 LANGUAGE_MAP = {
     "日本語": "ja",
@@ -9,6 +16,26 @@ LANGUAGE_MAP = {
     "English": "en"
 }
 
+NUM_CTX = 10240
+# Context tokens kept free for the model's answer in every request
+RESPONSE_TOKENS = 2048
+# Requests sent to the summary backend at the same time while summarizing chunks
+MAX_PARALLEL_REQUESTS = 2
+# How long Ollama keeps the model (and its prompt cache) loaded between the requests of one meeting
+KEEP_ALIVE = "10m"
+# Bump when the transcript compaction rules change, so cached summaries are not reused
+COMPACTION_VERSION = 3
+
+# Instruction for the map step, used when the meeting does not fit into one request
+CHUNK_PROMPTS = {
+    "en": "The text above is part {part} of {parts} of a meeting transcript. Write concise notes of this part in English. "
+          "Keep every discussion point, decision, action item, responsible person, date and number. No introduction.",
+    "ja": "上記は会議の文字起こしの第{part}部（全{parts}部）です。この部分を日本語で簡潔なメモにまとめてください。"
+          "議論点、決定事項、行動項目、担当者、日付、数値はすべて残してください。前置きは不要です。",
+    "zh": "以上是会议记录的第{part}部分（共{parts}部分）。请用中文将这一部分整理成简洁的笔记。"
+          "保留所有讨论点、决策、行动项、负责人、日期和数字。不需要开场白。",
+}
+
 def load_config(config_filepath):
     """Read configuration from config.json, including language for summary generation"""
     if not os.path.exists(config_filepath):
@@ -24,7 +51,12 @@ def load_config(config_filepath):
         return None
 
 def load_segments_from_json(filepath):
-    """Load transcription segments from a local JSON file"""
+    """Load transcription segments, from the binary copy of a local JSON file when it is up to date"""
+    transcript = load_fresh_transcript(filepath)
+    if transcript is not None:
+        # lazy, memory-mapped segments: only the text column is read when summarizing
+        return transcript.segments
+
     if not os.path.exists(filepath):
         print(f"File not found: {filepath}")
         return None
@@ -52,41 +84,280 @@ def load_prompt_from_json(prompt_path):
         print(f"Error reading prompt file: {e}")
         return None
 
-def summarize_meeting(segments, model, gpt_dict_raw_text, prompt_path):
-    """Generate a meeting summary with action items, using the Ollama API"""
+def prompt_language(prompt_path):
+    """Language code of a prompt file from its folder, prompt/<lang>/<name>.json"""
+    language = os.path.basename(os.path.dirname(os.path.abspath(prompt_path)))
+    return language if language in CHUNK_PROMPTS else "en"
+
+# Token counts and durations (ns) reported with a finished answer, recorded in prompt traces
+TRACE_COUNTS = ("prompt_eval_count", "prompt_eval_duration", "eval_count", "eval_duration", "load_duration")
+
+def chat(model, content, num_ctx=NUM_CTX, backend=None, keep_alive=None, tracer=None, kind="summary"):
+    """Send one user message to the summary backend and return the answer, or None on failure"""
+    start = time.perf_counter()
+    with span(f"llm_{kind}"):
+        response = (backend or get_backend()).chat(
+            model,
+            [{"role": "user", "content": content}],
+            num_ctx=num_ctx,
+            num_predict=-1,
+            keep_alive=keep_alive
+        )
+
+    done = response.get('done', False)
+    answer = response['content'] if done else None
+    if tracer is not None:
+        tracer.record(kind, model, content, answer, start, time.perf_counter(),
+                      counts={name: response.get(name) for name in TRACE_COUNTS})
+    if not done:
+        print("Failed to generate summary.")
+    return answer
+
+def chat_stream(model, content, num_ctx=NUM_CTX, backend=None, stats=None, tracer=None, kind="summary"):
+    """
+    Send one user message to the summary backend and yield the answer piece by piece as it is generated.
+
+    If a dict is passed as `stats`, it is filled with time_to_first_token (s), tokens,
+    tokens_per_second and total_time (s) once the answer is complete.
+    """
+    start = time.perf_counter()
+    first_token = None
+    pieces = []
+    final = None
+    with span(f"llm_{kind}"):
+        for part in (backend or get_backend()).chat_stream(
+            model,
+            [{"role": "user", "content": content}],
+            num_ctx=num_ctx,
+            num_predict=-1
+        ):
+            text = part['content']
+            if text:
+                if first_token is None:
+                    first_token = time.perf_counter()
+                pieces.append(text)
+                yield text
+            if part.get('done', False):
+                final = part
+    end = time.perf_counter()
+
+    if tracer is not None:
+        tracer.record(kind, model, content, "".join(pieces) if final is not None else None, start, end, first_token,
+                      counts={name: final.get(name) for name in TRACE_COUNTS} if final is not None else None)
+    if final is None:
+        print("Failed to generate summary.")
+        return
+    # The server reports the generated token count (and for Ollama the generation time in ns) last
+    tokens = final.get('eval_count') or len(pieces)
+    eval_seconds = (final.get('eval_duration') or 0) / 1e9 or (end - (first_token or start))
+    ttft = (first_token or end) - start
+    tokens_per_second = tokens / eval_seconds if eval_seconds > 0 else 0.0
+    print(f"Time to first token: {ttft:.2f}s, {tokens} tokens at {tokens_per_second:.1f} tokens/s")
+    if stats is not None:
+        stats.update(time_to_first_token=ttft, tokens=tokens, tokens_per_second=tokens_per_second,
+                     total_time=end - start)
+
+def summarize_chunks(chunks, model, gpt_dict_raw_text, language, num_ctx=NUM_CTX, max_workers=MAX_PARALLEL_REQUESTS,
+                     backend=None, tracer=None):
+    """Map step: summarize every chunk on its own, at most max_workers requests at a time"""
+    def summarize_chunk(part):
+        instruction = CHUNK_PROMPTS[language].format(part=part + 1, parts=len(chunks))
+        return chat(model, f"{chunks[part]}\n{gpt_dict_raw_text}\n{instruction}\n", num_ctx, backend,
+                    tracer=tracer, kind="chunk")
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(bind_job(summarize_chunk), range(len(chunks))))
+
+def summary_instructions(prompt_data):
+    """The part of a summary request that depends on the prompt template"""
+    return (
+        f"{prompt_data.get('system_prompt', '')}\n"
+        f"{prompt_data.get('user_prompt', '')}\n"
+    )
+
+def build_meeting_prefix(segments, model, gpt_dict_raw_text, language, instruction_tokens, num_ctx=NUM_CTX,
+                         max_workers=MAX_PARALLEL_REQUESTS, backend=None, tracer=None, speaker_labels=False):
+    """
+    Build the start of every summary request of a meeting: the meeting text (or chunk notes) and the glossary.
+
+    The transcript is compacted first (speaker turns merged, repeated lines and fillers dropped,
+    optionally "<speaker>: " prefixes) and measured in the model's tokens. A meeting that does not fit into num_ctx next to instruction_tokens of prompt template is reduced
+    map-reduce style first: the transcript is cut into chunks that fit, each chunk is summarized
+    (max_workers requests at a time), and the joined chunk notes take the place of the transcript.
+    `backend` is a summary.backends.LLMBackend; by default the process-wide one from
+    SUMMARY_BACKEND is used. Requests are recorded by `tracer` (a summary.trace.PromptTracer) if one is given.
+    """
+    count = token_counter(model, backend)
+    lines = compact_transcript(segments, speaker_labels=speaker_labels)
+    glossary = f"{gpt_dict_raw_text}\n"
+    budget = num_ctx - RESPONSE_TOKENS - count(glossary) - instruction_tokens - count(CHUNK_PROMPTS[language])
+    if budget <= 0:
+        print("Prompt and glossary leave no room for the transcript in num_ctx.")
+        return None
+
+    # Reduce until the notes fit; give up if a round does not shrink them
+    meeting_tokens = count("\n".join(lines))
+    while meeting_tokens > budget:
+        chunks = chunk_lines(lines, budget, count)
+        print(f"Transcript has ~{meeting_tokens} tokens, summarizing {len(chunks)} chunks first...")
+        notes = summarize_chunks(chunks, model, gpt_dict_raw_text, language, num_ctx, max_workers, backend, tracer)
+        if any(note is None for note in notes):
+            return None
+        notes_tokens = count("\n".join(notes))
+        if notes_tokens >= meeting_tokens:
+            print(f"Chunk notes (~{notes_tokens} tokens) are no shorter than their input and do not fit into num_ctx.")
+            return None
+        lines = notes
+        meeting_tokens = notes_tokens
+
+    return "\n".join(lines) + "\n" + glossary
+
+@timed("summary_prompt")
+def build_summary_prompt(segments, model, gpt_dict_raw_text, prompt_path, num_ctx=NUM_CTX,
+                         max_workers=MAX_PARALLEL_REQUESTS, backend=None, tracer=None, speaker_labels=False):
+    """Build the final summary request: meeting text (or chunk notes) and glossary, then the prompt template"""
     # Load user and system prompt data based on language
     prompt_data = load_prompt_from_json(prompt_path)
     if not prompt_data:
         print("Failed to load prompt data.")
         return None
 
-    meeting_text = "\n".join([seg.get("text", "") for seg in segments])
+    instructions = summary_instructions(prompt_data)
+    prefix = build_meeting_prefix(segments, model, gpt_dict_raw_text, prompt_language(prompt_path),
+                                  token_counter(model, backend)(instructions), num_ctx, max_workers, backend, tracer,
+                                  speaker_labels)
+    if prefix is None:
+        return None
 
     # Combine system and user prompts into one message
-    combined_prompt = (
-        f"{meeting_text}\n"
-        f"{gpt_dict_raw_text}\n"
-        f"{prompt_data.get('system_prompt', '')}\n"
-        f"{prompt_data.get('user_prompt', '')}\n"
-    )
-    with open("test.json", "w", encoding="utf-8") as file:
-            json.dump(combined_prompt, file, ensure_ascii=False, indent=4)
-
-    # Send the combined prompt to Ollama
-    response = ollama.chat(
-        model=model,
-        messages=[{"role": "user", "content": combined_prompt}],
-        options= Options(
-                        num_ctx=10240,
-                        num_predict=-1)
-    )
+    return prefix + instructions
 
-    if response.get('done', False):
-        summary = response['message']['content']
-        return summary
+def summary_key(segments, model, gpt_dict_raw_text, prompt_path, num_ctx=NUM_CTX, speaker_labels=False):
+    """Cache key of a summary request, or None if the prompt file cannot be read"""
+    prompt_data = load_prompt_from_json(prompt_path)
+    if not prompt_data:
+        return None
+    options = {"num_ctx": num_ctx, "num_predict": -1, "response_tokens": RESPONSE_TOKENS,
+               "chunk_prompt": CHUNK_PROMPTS[prompt_language(prompt_path)], "speaker_labels": speaker_labels,
+               "compaction": COMPACTION_VERSION}
+    if speaker_labels:
+        # the prompt names the speakers, so relabelled speakers need a new summary
+        lines = (f"{seg.get('speaker')}: {seg.get('text', '')}" for seg in segments)
     else:
-        print("Failed to generate summary.")
+        lines = (seg.get("text", "") for seg in segments)
+    return summary_cache_key(lines, prompt_data, gpt_dict_raw_text, model, options)
+
+@timed("summarize")
+def summarize_meeting(segments, model, gpt_dict_raw_text, prompt_path, num_ctx=NUM_CTX,
+                      max_workers=MAX_PARALLEL_REQUESTS, backend=None, use_cache=True, refresh=False, tracer=None,
+                      speaker_labels=False):
+    """
+    Generate a meeting summary with action items, using the summary backend (Ollama by default).
+
+    With use_cache, a summary of the same transcript, prompt, glossary, model and options is
+    returned from the summary cache; refresh regenerates it and replaces the cached entry.
+    """
+    key = summary_key(segments, model, gpt_dict_raw_text, prompt_path, num_ctx, speaker_labels) if use_cache else None
+    if key and not refresh:
+        summary = summary_cache.get(key)
+        if summary is not None:
+            print("Summary loaded from cache.")
+            return summary
+
+    combined_prompt = build_summary_prompt(segments, model, gpt_dict_raw_text, prompt_path, num_ctx, max_workers, backend,
+                                           tracer, speaker_labels)
+    if combined_prompt is None:
         return None
+    summary = chat(model, combined_prompt, num_ctx, backend, tracer=tracer)
+    if key and summary is not None:
+        summary_cache.put(key, summary, model=model, prompt_path=prompt_path)
+    return summary
+
+def stream_summary(segments, model, gpt_dict_raw_text, prompt_path, num_ctx=NUM_CTX,
+                   max_workers=MAX_PARALLEL_REQUESTS, backend=None, stats=None, use_cache=True, refresh=False,
+                   tracer=None, speaker_labels=False):
+    """
+    Like summarize_meeting, but yield the summary piece by piece as the model generates it.
+
+    A cached summary is yielded in one piece, with stats["cached"] set.
+    """
+    stats = {} if stats is None else stats
+    key = summary_key(segments, model, gpt_dict_raw_text, prompt_path, num_ctx, speaker_labels) if use_cache else None
+    if key and not refresh:
+        summary = summary_cache.get(key)
+        if summary is not None:
+            print("Summary loaded from cache.")
+            stats.update(time_to_first_token=0.0, tokens=0, tokens_per_second=0.0, total_time=0.0, cached=True)
+            yield summary
+            return
+
+    combined_prompt = build_summary_prompt(segments, model, gpt_dict_raw_text, prompt_path, num_ctx, max_workers, backend,
+                                           tracer, speaker_labels)
+    if combined_prompt is None:
+        return
+    pieces = []
+    for piece in chat_stream(model, combined_prompt, num_ctx, backend, stats, tracer):
+        pieces.append(piece)
+        yield piece
+    # only complete answers are cached
+    if key and stats:
+        summary_cache.put(key, "".join(pieces), model=model, prompt_path=prompt_path)
+
+def summarize_prompts(segments, model, gpt_dict_raw_text, prompt_paths, num_ctx=NUM_CTX,
+                      max_workers=MAX_PARALLEL_REQUESTS, backend=None, use_cache=True, refresh=False, tracer=None,
+                      speaker_labels=False):
+    """
+    Summarize one meeting with several prompt templates, yielding (prompt_path, summary) as each completes.
+
+    Every request is the same meeting prefix (transcript or chunk notes, then glossary) followed by
+    its template, so Ollama can reuse the processed prefix from its prompt cache while keep_alive
+    holds the model loaded. The first request runs alone to fill that cache, the others then run
+    max_workers at a time. Chunk notes of a long meeting are made once, in the first prompt's language.
+    A summary is None if it failed.
+    """
+    pending = {}
+    for prompt_path in prompt_paths:
+        prompt_data = load_prompt_from_json(prompt_path)
+        if not prompt_data:
+            yield prompt_path, None
+            continue
+        key = (summary_key(segments, model, gpt_dict_raw_text, prompt_path, num_ctx, speaker_labels)
+               if use_cache else None)
+        summary = summary_cache.get(key) if key and not refresh else None
+        if summary is not None:
+            yield prompt_path, summary
+            continue
+        pending[prompt_path] = (summary_instructions(prompt_data), key)
+    if not pending:
+        return
+
+    paths = list(pending)
+    count = token_counter(model, backend)
+    instruction_tokens = max(count(instructions) for instructions, _ in pending.values())
+    prefix = build_meeting_prefix(segments, model, gpt_dict_raw_text, prompt_language(paths[0]), instruction_tokens,
+                                  num_ctx, max_workers, backend, tracer, speaker_labels)
+    if prefix is None:
+        for prompt_path in paths:
+            yield prompt_path, None
+        return
+
+    def summarize(prompt_path):
+        instructions, key = pending[prompt_path]
+        summary = chat(model, prefix + instructions, num_ctx, backend, keep_alive=KEEP_ALIVE, tracer=tracer)
+        if key and summary is not None:
+            summary_cache.put(key, summary, model=model, prompt_path=prompt_path)
+        return summary
+
+    yield paths[0], summarize(paths[0])
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(bind_job(summarize), prompt_path): prompt_path for prompt_path in paths[1:]}
+        for future in as_completed(futures):
+            yield futures[future], future.result()
+
+def summary_markdown_path(output_dir, prompt_path):
+    """Markdown file of the summary made with one of several prompts"""
+    prompt_name = os.path.splitext(os.path.basename(prompt_path))[0]
+    return os.path.join(output_dir, f"meeting_summary - {prompt_name}.md")
 
 def save_summary_to_markdown(summary, output_filepath):
     """Save the generated meeting summary to a Markdown file"""
@@ -100,17 +371,38 @@ def save_summary_to_markdown(summary, output_filepath):
     except Exception as e:
         print(f"Error saving meeting summary: {e}")
 
-def populate_sum_model():
-    """Check local Ollama models and return a list of model names"""
+def stream_summary_to_markdown(pieces, output_filepath, stats=None):
+    """
+    Write summary pieces to a Markdown file as they arrive, passing them on to the caller.
+
+    The pieces go to a temporary file next to output_filepath, which replaces it only once all
+    pieces arrived (and `stats`, if given, was filled by the finished generation), so a failed
+    or aborted generation keeps the previous summary.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(output_filepath) or ".", suffix=".tmp")
+    complete = False
     try:
-        models = ollama.list()
-        if models and 'models' in models:
-            model_names = [model['model'] for model in models['models']]
-            return model_names
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write("# Meeting Summary\n\n")
+            for piece in pieces:
+                f.write(piece)
+                yield piece
+        complete = stats is None or bool(stats)
+    finally:
+        if complete:
+            os.replace(tmp_path, output_filepath)
+            print(f"Meeting summary saved to {output_filepath}")
         else:
-            return None
+            os.remove(tmp_path)
+            print(f"Summary incomplete, {output_filepath} left unchanged")
+
+def populate_sum_model():
+    """Check the summary backend's models and return a list of model names"""
+    try:
+        model_names = get_backend().list_models()
+        return model_names or None
     except Exception as e:
-        print(f"Error fetching ollama models: {e}")
+        print(f"Error fetching summary models: {e}")
         return None
 
 if __name__ == "__main__":
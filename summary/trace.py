@@ -0,0 +1,122 @@
+"""
+Opt-in tracing of the requests sent to the summarization model.
+
+Set SUMMARY_TRACE=1 to have every summary job write its own prompt_trace-<time>-<job id>.jsonl
+into its result folder: one JSON line per request with timing, token counts and the (clipped)
+prompt and answer. Only the newest MAX_TRACE_FILES traces of a folder are kept.
+Records are written by a background thread, so tracing adds no file I/O to the request path.
+"""
+import glob
+import json
+import os
+import queue
+import threading
+import time
+import uuid
+
+TRACE_ENV = "SUMMARY_TRACE"
+TRACE_PREFIX = "prompt_trace-"
+MAX_TRACE_FILES = 20
+MAX_TRACE_BYTES = 8 * 1024 * 1024
+# Longer prompts/answers keep their start and end
+MAX_TEXT_CHARS = 16000
+
+_queue = queue.Queue()
+_writer = None
+_writer_lock = threading.Lock()
+
+def _write_loop():
+    while True:
+        path, line, mode = _queue.get()
+        try:
+            with open(path, mode, encoding="utf-8") as f:
+                f.write(line)
+        except Exception as e:
+            print(f"Error writing prompt trace {path}: {e}")
+        finally:
+            _queue.task_done()
+
+def _enqueue(path, line, mode):
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = threading.Thread(target=_write_loop, name="prompt-trace-writer", daemon=True)
+            _writer.start()
+    _queue.put((path, line, mode))
+
+def clip_text(text, max_chars=MAX_TEXT_CHARS):
+    if text is None or len(text) <= max_chars:
+        return text
+    half = max_chars // 2
+    return f"{text[:half]}\n[... {len(text) - 2 * half} characters clipped ...]\n{text[-half:]}"
+
+class PromptTracer:
+    """Collects request records of one job into its own JSON-lines file"""
+
+    def __init__(self, path, max_bytes=MAX_TRACE_BYTES, max_text_chars=MAX_TEXT_CHARS):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_text_chars = max_text_chars
+        self.written = 0
+        self.truncated = False
+        self._lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+
+    def record(self, kind, model, prompt, response, started, finished, first_token=None, counts=None):
+        """
+        Queue one request record. started/finished/first_token are time.perf_counter() values;
+        counts holds Ollama's token counts and durations (prompt_eval_count, eval_count, ...).
+        """
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "kind": kind,
+            "model": model,
+            "duration": round(finished - started, 3),
+            "time_to_first_token": None if first_token is None else round(first_token - started, 3),
+            "prompt_chars": len(prompt),
+            "response_chars": None if response is None else len(response),
+        }
+        for name, value in (counts or {}).items():
+            if value is not None:
+                entry[name] = value
+        entry["prompt"] = clip_text(prompt, self.max_text_chars)
+        entry["response"] = clip_text(response, self.max_text_chars)
+        line = json.dumps(entry, ensure_ascii=False) + "\n"
+        size = len(line.encode("utf-8"))
+
+        with self._lock:
+            if self.truncated:
+                return
+            if self.written + size > self.max_bytes:
+                self.truncated = True
+                line = json.dumps({"kind": "truncated", "max_bytes": self.max_bytes}) + "\n"
+                size = len(line)
+            mode = "w" if self.written == 0 else "a"
+            self.written += size
+            _enqueue(self.path, line, mode)
+
+    def flush(self):
+        """Wait until all queued records are on disk"""
+        _queue.join()
+
+def trace_path(output_dir):
+    """A new trace file of one job; the name sorts by start time and differs between concurrent jobs"""
+    now = time.time()
+    started = time.strftime("%Y%m%d-%H%M%S", time.localtime(now)) + f"{int(now % 1 * 1000):03d}"
+    return os.path.join(output_dir, f"{TRACE_PREFIX}{started}-{uuid.uuid4().hex[:8]}.jsonl")
+
+def prune_traces(output_dir, keep=MAX_TRACE_FILES):
+    """Delete all but the `keep` newest trace files of a folder"""
+    for path in sorted(glob.glob(os.path.join(glob.escape(output_dir), f"{TRACE_PREFIX}*.jsonl")))[:-keep or None]:
+        try:
+            os.remove(path)
+        except OSError as e:
+            print(f"Error removing old prompt trace {path}: {e}")
+
+def tracer_for_job(output_dir):
+    """A PromptTracer writing a new trace file into a job's result folder if SUMMARY_TRACE is set, otherwise None"""
+    if os.environ.get(TRACE_ENV, "").lower() not in ("1", "true", "yes"):
+        return None
+    if os.path.isdir(output_dir):
+        prune_traces(output_dir, MAX_TRACE_FILES - 1)
+    return PromptTracer(trace_path(output_dir))
@@ -0,0 +1,16 @@
+import pytest
+
+pytest.importorskip("httpx")
+
+from summary.compaction import compact_transcript, strip_disfluencies
+
+def test_chinese_fillers_are_removed():
+    assert strip_disfluencies("嗯，我们呃下周开会。额，预算呢？唔", "zh") == "我们下周开会。预算呢？"
+
+def test_chinese_words_containing_filler_characters_are_kept():
+    assert strip_disfluencies("金额是多少，额外的名额。额外", "zh") == "金额是多少，额外的名额。额外"
+
+def test_repeated_lines_are_dropped_per_speaker():
+    segments = [{"text": "Yes.", "speaker": "A"}, {"text": "Yes.", "speaker": "B"},
+                {"text": "ok", "speaker": "B"}, {"text": "ok", "speaker": "B"}]
+    assert compact_transcript(segments, speaker_labels=True) == ["A: Yes.", "B: Yes. ok"]
@@ -0,0 +1,39 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("pyannote.audio")
+
+from pyannote.core import Annotation, Segment
+
+from whisper.audio import SAMPLE_RATE
+from whisper.diarize import DiarizationPipeline
+
+class WindowModel:
+    """Pipeline stand-in: speaker A (linkable) and B (NaN embedding), and no speech in the second window"""
+
+    def __init__(self):
+        self.calls = 0
+
+    def __call__(self, file, **kwargs):
+        self.calls += 1
+        annotation = Annotation()
+        if self.calls == 2:
+            return annotation, np.zeros((0, 2))
+        annotation[Segment(1.0, 5.0)] = "A"
+        annotation[Segment(6.0, 8.0)] = "B"
+        return annotation, np.array([[1.0, 0.0], [np.nan, np.nan]])
+
+def test_silent_windows_and_unlinkable_speakers_keep_their_turns():
+    pipeline = DiarizationPipeline.__new__(DiarizationPipeline)
+    pipeline.model = WindowModel()
+    audio = np.zeros(35 * SAMPLE_RATE, dtype=np.float32)
+
+    turns, embeddings = pipeline.diarize_windowed(audio, window=10.0, overlap=0.0, return_embeddings=True)
+
+    assert list(turns["start"]) == [1.0, 6.0, 21.0, 26.0, 31.0, 36.0]
+    speakers = list(turns["speaker"])
+    # A is linked across windows, every window's B is a speaker of its own
+    assert speakers[0] == speakers[2] == speakers[4]
+    assert len({speakers[1], speakers[3], speakers[5], speakers[0]}) == 4
+    assert list(embeddings) == [speakers[0]]
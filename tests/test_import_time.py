@@ -0,0 +1,21 @@
+import os
+
+import pytest
+
+from benchmarks.import_time import DEFAULT_MODULES, measure, report
+
+ROOT = os.path.join(os.path.dirname(__file__), "..")
+
+@pytest.mark.parametrize("module", DEFAULT_MODULES)
+def test_app_starts_without_the_speech_stack(module, monkeypatch):
+    # the time budget depends on the machine; check it with python -m benchmarks.import_time --budget
+    monkeypatch.chdir(ROOT)
+    try:
+        imports = measure(module)
+    except RuntimeError as e:
+        if "ModuleNotFoundError" in str(e):
+            pytest.skip(f"{module} cannot be imported here: {e}")
+        raise
+
+    result = report(module, imports, top=10, budget=float("inf"))
+    assert result["heavy"] == [], f"{module} imports {result['heavy']} at startup"
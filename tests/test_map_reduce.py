@@ -0,0 +1,149 @@
+import json
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("httpx")
+
+from summary.backends import OllamaBackend, StubBackend
+from summary.chunking import estimate_tokens
+from summary.compaction import token_counter
+from summary.ollama_bot import (CHUNK_PROMPTS, MAX_PARALLEL_REQUESTS, RESPONSE_TOKENS, build_summary_prompt,
+                                summarize_meeting)
+
+PROMPT_PATH = os.path.join(os.path.dirname(__file__), "..", "prompt", "en", "Default-Meeting Summary.json")
+NUM_CTX = 4096
+
+class EchoBackend(StubBackend):
+    """Answers with the request itself, so chunk notes never get shorter"""
+
+    def _reply(self, model, messages):
+        super()._reply(model, messages)
+        return messages[-1]["content"]
+
+def meeting(num_segments):
+    return [{"start": float(i), "end": i + 1.0,
+             "text": f"Item {i}: we discussed topic {i} and agreed that owner {i % 7} follows up on budget {i * 13}."}
+            for i in range(num_segments)]
+
+def test_short_meeting_is_sent_in_one_request():
+    backend = StubBackend()
+    prompt = build_summary_prompt(meeting(20), "stub", "", PROMPT_PATH, NUM_CTX, backend=backend)
+
+    assert prompt is not None and "Item 19" in prompt
+    assert backend.requests == []
+
+def test_long_meeting_is_reduced_to_chunk_notes_that_fit():
+    backend = StubBackend()
+    count = token_counter("stub", backend)
+    prompt = build_summary_prompt(meeting(600), "stub", "", PROMPT_PATH, NUM_CTX, max_workers=3, backend=backend)
+
+    assert prompt is not None
+    assert "Item 599" not in prompt
+    assert len(backend.requests) > 1
+    for request in backend.requests:
+        assert count(request["messages"][-1]["content"]) <= NUM_CTX - RESPONSE_TOKENS
+    assert count(prompt) <= NUM_CTX - RESPONSE_TOKENS
+    # the notes replace the transcript in chunk order; a stub note quotes the first line of its chunk
+    notes = [line for line in prompt.splitlines() if line.startswith("Summary ")]
+    assert len(notes) == len(backend.requests)
+    first_items = [int(note.split(": Item ", 1)[1].split(":", 1)[0]) for note in notes]
+    assert first_items[0] == 0 and first_items == sorted(first_items)
+
+def test_summary_is_generated_from_the_notes():
+    backend = StubBackend()
+    summary = summarize_meeting(meeting(600), "stub", "", PROMPT_PATH, NUM_CTX, backend=backend, use_cache=False)
+
+    assert summary.startswith("Summary ")
+    final_request = backend.requests[-1]["messages"][-1]["content"]
+    assert final_request.count("Summary ") == len(backend.requests) - 1
+
+def test_notes_that_do_not_shrink_are_not_sent_truncated():
+    backend = EchoBackend()
+    assert build_summary_prompt(meeting(600), "stub", "", PROMPT_PATH, NUM_CTX, backend=backend) is None
+    assert summarize_meeting(meeting(600), "stub", "", PROMPT_PATH, NUM_CTX, backend=backend, use_cache=False) is None
+
+class StubOllamaServer(ThreadingHTTPServer):
+    """Local /api/chat and /api/embed endpoints that record requests and their peak concurrency"""
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), StubOllamaHandler)
+        self.chats = []
+        self.active = 0
+        self.peak = 0
+        self.condition = threading.Condition()
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server_address[1]}"
+
+class StubOllamaHandler(BaseHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+    def reply(self, data):
+        body = json.dumps(data).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        request = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if self.path == "/api/embed":
+            # exact counts equal to the estimate, so the chunk budgets match the StubBackend tests
+            self.reply({"model": request["model"], "embeddings": [[0.0]],
+                        "prompt_eval_count": estimate_tokens(request["input"])})
+            return
+        server = self.server
+        with server.condition:
+            server.chats.append(request)
+            server.active += 1
+            server.peak = max(server.peak, server.active)
+            server.condition.notify_all()
+            # hold each request until the allowed number of requests run, so the peak does not depend on timing
+            server.condition.wait_for(lambda: server.active >= MAX_PARALLEL_REQUESTS, timeout=1.0)
+        content = request["messages"][-1]["content"]
+        try:
+            self.reply({"model": request["model"], "created_at": "2024-01-01T00:00:00Z",
+                        "message": {"role": "assistant", "content": f"Summary: {content.splitlines()[0][:60]}"},
+                        "done": True, "prompt_eval_count": estimate_tokens(content), "eval_count": 10})
+        finally:
+            with server.condition:
+                server.active -= 1
+
+@pytest.fixture
+def ollama_server():
+    pytest.importorskip("ollama")
+    server = StubOllamaServer()
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def test_ollama_backend_sends_chunk_and_reduce_requests(ollama_server):
+    backend = OllamaBackend(host=ollama_server.url, retries=0)
+    summary = summarize_meeting(meeting(600), "stub", "", PROMPT_PATH, NUM_CTX, backend=backend, use_cache=False)
+
+    chats = ollama_server.chats
+    assert summary.startswith("Summary: ")
+    assert len(chats) > 2
+    for request in chats:
+        assert request["model"] == "stub"
+        assert request["stream"] is False
+        assert request["options"]["num_ctx"] == NUM_CTX
+
+    # map: one request per chunk with the chunk instruction, reduce: the final request over all notes
+    chunk_requests, reduce_request = chats[:-1], chats[-1]["messages"][-1]["content"]
+    parts = len(chunk_requests)
+    instructions = sorted(CHUNK_PROMPTS["en"].format(part=part, parts=parts) for part in range(1, parts + 1))
+    assert sorted(request["messages"][-1]["content"].rstrip().splitlines()[-1] for request in chunk_requests) \
+        == instructions
+    assert "part 1 of" not in reduce_request
+    assert reduce_request.count("Summary: ") == parts
+    assert ollama_server.peak == MAX_PARALLEL_REQUESTS
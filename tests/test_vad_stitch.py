@@ -0,0 +1,57 @@
+import numpy as np
+import pytest
+
+pytest.importorskip("torch")
+pytest.importorskip("pyannote.core")
+
+from pyannote.core import SlidingWindow, SlidingWindowFeature
+
+from whisper.vad import stitch_scores
+
+SAMPLE_RATE = 16000
+# frame step of the pyannote segmentation model
+STEP = 0.016875
+
+def speech_probability(t):
+    """A smooth score timeline with a known maximum slope"""
+    return 0.5 + 0.4 * np.sin(t / 3.0) + 0.1 * np.sin(t * 1.7)
+
+MAX_SLOPE = 0.4 / 3.0 + 0.1 * 1.7
+
+def window_scores(seconds, window, overlap):
+    """(start_sample, scores) of overlapping windows, as ParallelVoiceActivitySegmentation produces them"""
+    num_samples = int(seconds * SAMPLE_RATE)
+    window_samples = int(window * SAMPLE_RATE)
+    hop = window_samples - int(overlap * SAMPLE_RATE)
+    windows = []
+    for start in range(0, num_samples - window_samples + hop, hop):
+        length = min(window_samples, num_samples - start) / SAMPLE_RATE
+        times = start / SAMPLE_RATE + np.arange(int(length / STEP)) * STEP
+        frames = SlidingWindow(start=0.0, duration=STEP, step=STEP)
+        windows.append((start, SlidingWindowFeature(speech_probability(times)[:, None].astype(np.float32), frames)))
+    return num_samples, windows
+
+@pytest.mark.parametrize("seconds, window, overlap", [(120.0, 30.0, 2.0), (95.3, 20.0, 5.0), (61.0, 60.0, 10.0)])
+def test_stitched_scores_match_monolithic_within_one_frame(seconds, window, overlap):
+    num_samples, windows = window_scores(seconds, window, overlap)
+    stitched = stitch_scores(windows, num_samples, SAMPLE_RATE)
+
+    monolithic = speech_probability(np.arange(int(seconds / STEP)) * STEP)
+    assert stitched.sliding_window.step == pytest.approx(STEP)
+    assert stitched.sliding_window.start == pytest.approx(0.0)
+    assert abs(stitched.data.shape[0] - monolithic.shape[0]) <= 1
+
+    # a window start off the frame grid moves its frames by less than one frame
+    length = min(stitched.data.shape[0], monolithic.shape[0])
+    assert np.max(np.abs(stitched.data[:length, 0] - monolithic[:length])) <= MAX_SLOPE * STEP + 1e-6
+
+def test_aligned_windows_stitch_exactly():
+    # windows starting on the frame grid reproduce the scores exactly
+    frame_samples = 320
+    scores = np.random.default_rng(0).random((1000, 1)).astype(np.float32)
+    frames = SlidingWindow(start=0.0, duration=0.02, step=0.02)
+    windows = [(start * frame_samples, SlidingWindowFeature(scores[start:start + 300], frames))
+               for start in range(0, 1000, 250)]
+
+    stitched = stitch_scores(windows, 1000 * frame_samples, SAMPLE_RATE)
+    np.testing.assert_allclose(stitched.data, scores, rtol=0, atol=1e-6)
@@ -1,15 +1,16 @@
-import os
-import warnings
-from typing import List, Union, Optional, NamedTuple
+import queue
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+from typing import Iterable, Iterator, List, Union, Optional, NamedTuple
 
 import ctranslate2
 import faster_whisper
 import numpy as np
 import torch
-from transformers import Pipeline
-from transformers.pipelines.pt_utils import PipelineIterator
 
-from .audio import N_SAMPLES, SAMPLE_RATE, load_audio, log_mel_spectrogram
+from .audio import N_FRAMES, N_MELS, N_SAMPLES, SAMPLE_RATE, load_audio, log_mel_spectrogram
+from .metrics import bind_job, current_span, span, timed
 from .vad import load_vad_model, merge_chunks
 from .types import TranscriptionResult, SingleSegment
 
@@ -22,6 +23,11 @@ def find_numeral_symbol_tokens(tokenizer):
             numeral_symbol_tokens.append(i)
     return numeral_symbol_tokens
 
+def _batched(iterable, n):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, n)):
+        yield batch
+
 def load_model(whisper_arch,
                device,
                device_index=0,
@@ -31,7 +37,8 @@ def load_model(whisper_arch,
                vad_options=None,
                model=None,
                task="transcribe",
-               download_root=None):
+               download_root=None,
+               cpu_threads=0):
     '''Load a Whisper model for inference.
     Args:
         whisper_arch: str - The name of the Whisper model to load.
@@ -40,6 +47,7 @@ def load_model(whisper_arch,
         options: dict - A dictionary of options to use for the model.
         language: str - The language of the model. (use English for now)
         download_root: Optional[str] - The root directory to download the model to.
+        cpu_threads: int - CTranslate2 threads used on CPU (0 uses the library default).
     Returns:
         A Whisper pipeline.
     '''
@@ -51,7 +59,8 @@ def load_model(whisper_arch,
                          device=device,
                          device_index=device_index,
                          compute_type=compute_type,
-                         download_root=download_root)
+                         download_root=download_root,
+                         cpu_threads=cpu_threads)
     if language is not None:
         tokenizer = faster_whisper.tokenizer.Tokenizer(model.hf_tokenizer, model.model.is_multilingual, task=task, language=language)
     else:
@@ -99,7 +108,13 @@ def load_model(whisper_arch,
 
     default_vad_options = {
         "vad_onset": 0.500,
-        "vad_offset": 0.363
+        "vad_offset": 0.363,
+        "vad_method": "pyannote",
+        "vad_batch_size": 32,
+        "vad_step": None,
+        "vad_num_threads": None,
+        "vad_num_workers": None,
+        "vad_cache_dir": None,
     }
 
     if vad_options is not None:
@@ -124,34 +139,24 @@ class WhisperModel(faster_whisper.WhisperModel):
 
     def generate_segment_batched(self, features: np.ndarray, tokenizer: faster_whisper.tokenizer.Tokenizer, options: faster_whisper.transcribe.TranscriptionOptions, encoder_output = None):
         batch_size = features.shape[0]
-        all_tokens = []
-        prompt_reset_since = 0
-        if options.initial_prompt is not None:
-            initial_prompt = " " + options.initial_prompt.strip()
-            initial_prompt_tokens = tokenizer.encode(initial_prompt)
-            all_tokens.extend(initial_prompt_tokens)
-        previous_tokens = all_tokens[prompt_reset_since:]
-        prompt = self.get_prompt(
-            tokenizer,
-            previous_tokens,
-            without_timestamps=options.without_timestamps,
-            prefix=options.prefix,
-        )
+        prompt = self.get_batch_prompt(tokenizer, options)
 
-        encoder_output = self.encode(features)
+        with span("encode"):
+            encoder_output = self.encode(features)
 
         max_initial_timestamp_index = int(
             round(options.max_initial_timestamp / self.time_precision)
         )
 
-        result = self.model.generate(
-                encoder_output,
-                [prompt] * batch_size,
-                length_penalty=options.length_penalty,
-                max_length=self.max_length,
-                suppress_blank=options.suppress_blank,
-                suppress_tokens=options.suppress_tokens,
-            )
+        with span("decode"):
+            result = self.model.generate(
+                    encoder_output,
+                    [prompt] * batch_size,
+                    length_penalty=options.length_penalty,
+                    max_length=self.max_length,
+                    suppress_blank=options.suppress_blank,
+                    suppress_tokens=options.suppress_tokens,
+                )
 
         tokens_batch = [x.sequences_ids[0] for x in result]
 
@@ -166,6 +171,35 @@ class WhisperModel(faster_whisper.WhisperModel):
 
         return text
 
+    def get_batch_prompt(self, tokenizer: faster_whisper.tokenizer.Tokenizer, options: faster_whisper.transcribe.TranscriptionOptions) -> List[int]:
+        '''
+        Return the decoder prompt shared by every sample of a batch.
+        The initial prompt and hotwords (e.g. from a glossary) are tokenized once per
+        tokenizer/options combination and reused for all following batches.
+        '''
+        key = (
+            tokenizer.language_code,
+            tokenizer.task,
+            options.initial_prompt,
+            options.prefix,
+            options.hotwords,
+            options.without_timestamps,
+        )
+        prompt_cache = self.__dict__.setdefault("_prompt_cache", {})
+        if key not in prompt_cache:
+            previous_tokens = []
+            if options.initial_prompt is not None:
+                initial_prompt = " " + options.initial_prompt.strip()
+                previous_tokens.extend(tokenizer.encode(initial_prompt))
+            prompt_cache[key] = self.get_prompt(
+                tokenizer,
+                previous_tokens,
+                without_timestamps=options.without_timestamps,
+                prefix=options.prefix,
+                hotwords=options.hotwords or None,
+            )
+        return prompt_cache[key]
+
     def encode(self, features: np.ndarray) -> ctranslate2.StorageView:
         # When the model is running on multiple GPUs, the encoder output should be moved
         # to the CPU since we don't know which GPU will handle the next job.
@@ -177,9 +211,36 @@ class WhisperModel(faster_whisper.WhisperModel):
 
         return self.model.encode(features, to_cpu=to_cpu)
 
-class FasterWhisperPipeline(Pipeline):
+class BatchBuffer:
     """
-    Huggingface Pipeline wrapper for FasterWhisperModel.
+    Preallocated memory of one batch: zero-padded 30s audio rows and their log-Mel features.
+
+    Chunks are copied into the rows and the features are computed into place, so a reused
+    buffer needs no new batch-sized allocations. Pinned memory speeds up the copy to the GPU.
+    """
+
+    def __init__(self, batch_size: int, pin_memory: bool = False):
+        self.batch_size = batch_size
+        self.audio = torch.zeros(batch_size, N_SAMPLES, dtype=torch.float32, pin_memory=pin_memory)
+        self.features = torch.empty(batch_size, N_MELS, N_FRAMES, dtype=torch.float32, pin_memory=pin_memory)
+
+    @timed("features")
+    def fill(self, chunks: List[np.ndarray]) -> torch.Tensor:
+        """Write the features of up to batch_size chunks and return them as a view of the buffer"""
+        for i, chunk in enumerate(chunks):
+            length = min(chunk.shape[0], N_SAMPLES)
+            row = self.audio[i]
+            row[:length].copy_(torch.from_numpy(chunk[:length]))
+            row[length:].zero_()
+            log_mel_spectrogram(row, out=self.features[i])
+        return self.features[:len(chunks)]
+
+class FasterWhisperPipeline:
+    """
+    Batched transcription of VAD chunks with FasterWhisperModel.
+
+    Features of the next batches are computed in background threads while the model decodes
+    the current one; texts are returned in chunk order.
     """
     # TODO:
     # - add support for timestamp mode
@@ -192,85 +253,93 @@ class FasterWhisperPipeline(Pipeline):
             options : NamedTuple,
             tokenizer=None,
             device: Union[int, str, "torch.device"] = -1,
-            framework = "pt",
             language : Optional[str] = None,
             suppress_numerals: bool = False,
-            **kwargs
+            batch_size: Optional[int] = None,
     ):
         self.model = model
         self.tokenizer = tokenizer
         self.options = options
         self.preset_language = language
         self.suppress_numerals = suppress_numerals
-        self._batch_size = kwargs.pop("batch_size", None)
-        self._num_workers = 1
-        self._preprocess_params, self._forward_params, self._postprocess_params = self._sanitize_parameters(**kwargs)
-        self.call_count = 0
-        self.framework = framework
-        if self.framework == "pt":
-            if isinstance(device, torch.device):
-                self.device = device
-            elif isinstance(device, str):
-                self.device = torch.device(device)
-            elif device < 0:
-                self.device = torch.device("cpu")
-            else:
-                self.device = torch.device(f"cuda:{device}")
-        else:
+        self._batch_size = batch_size
+        self._buffers: List[BatchBuffer] = []
+        if isinstance(device, torch.device):
             self.device = device
-
-        super(Pipeline, self).__init__()
+        elif isinstance(device, str):
+            self.device = torch.device(device)
+        elif device < 0:
+            self.device = torch.device("cpu")
+        else:
+            self.device = torch.device(f"cuda:{device}")
         self.vad_model = vad
 
-    def _sanitize_parameters(self, **kwargs):
-        preprocess_kwargs = {}
-        if "tokenizer" in kwargs:
-            preprocess_kwargs["maybe_arg"] = kwargs["maybe_arg"]
-        return preprocess_kwargs, {}, {}
-
-    def preprocess(self, audio):
-        audio = audio['inputs']
-        features = log_mel_spectrogram(audio, padding=N_SAMPLES - audio.shape[0])
-        return {'inputs': features}
-
-    def _forward(self, model_inputs):
-        outputs = self.model.generate_segment_batched(model_inputs['inputs'], self.tokenizer, self.options)
-        return {'text': outputs}
-
-    def postprocess(self, model_outputs):
-        return model_outputs
-
-    def get_iterator(
-        self, inputs, num_workers: int, batch_size: int, preprocess_params, forward_params, postprocess_params
-    ):
-        dataset = PipelineIterator(inputs, self.preprocess, preprocess_params)
-        if "TOKENIZERS_PARALLELISM" not in os.environ:
-            os.environ["TOKENIZERS_PARALLELISM"] = "false"
-        # TODO hack by collating feature_extractor and image_processor
-
-        def stack(items):
-            return {'inputs': torch.stack([x['inputs'] for x in items])}
-        dataloader = torch.utils.data.DataLoader(dataset, num_workers=num_workers, batch_size=batch_size, collate_fn=stack)
-        model_iterator = PipelineIterator(dataloader, self.forward, forward_params, loader_batch_size=batch_size)
-        final_iterator = PipelineIterator(model_iterator, self.postprocess, postprocess_params)
-        return final_iterator
-
+    def batch_buffers(self, batch_size: int, count: int) -> List[BatchBuffer]:
+        """Batch buffers kept between calls, pinned if the model runs on CUDA"""
+        buffers = [buffer for buffer in self._buffers if buffer.batch_size == batch_size]
+        pin_memory = self.model.model.device == "cuda" and torch.cuda.is_available()
+        while len(buffers) < count:
+            buffers.append(BatchBuffer(batch_size, pin_memory=pin_memory))
+        self._buffers = buffers
+        return buffers[:count]
+
+    def forward(self, features: torch.Tensor) -> List[str]:
+        return self.model.generate_segment_batched(features, self.tokenizer, self.options)
+
+    def __call__(self, chunks: Iterable[np.ndarray], batch_size=None, num_workers=0) -> Iterator[str]:
+        """
+        Transcribe audio chunks of at most 30s and yield one text per chunk, in input order.
+
+        num_workers threads (at least one) compute the features of up to num_workers batches
+        ahead of the model. Features are written into num_workers + 1 reused BatchBuffers:
+        one being decoded and one per batch in preparation.
+        """
+        batch_size = max(1, batch_size or self._batch_size or 1)
+        num_workers = max(1, num_workers)
+        free = queue.SimpleQueue()
+        for buffer in self.batch_buffers(batch_size, num_workers + 1):
+            free.put(buffer)
+
+        # the workers record their feature spans into the caller's metrics job
+        @bind_job
+        def collate(batch):
+            buffer = free.get()
+            return buffer, buffer.fill(batch)
+
+        def forward(future):
+            buffer, features = future.result()
+            try:
+                return self.forward(features)
+            finally:
+                free.put(buffer)
+
+        pending = deque()
+        with ThreadPoolExecutor(max_workers=num_workers, thread_name_prefix="asr-features") as pool:
+            for batch in _batched(chunks, batch_size):
+                pending.append(pool.submit(collate, batch))
+                if len(pending) > num_workers:
+                    yield from forward(pending.popleft())
+            while pending:
+                yield from forward(pending.popleft())
+
+    @timed("transcribe")
     def transcribe(
         self, audio: Union[str, np.ndarray], batch_size=None, num_workers=0, language=None, task=None, chunk_size=30, 
         print_progress=False, combined_progress=False,progress_callback=None
     ) -> dict:
         if isinstance(audio, str):
             audio = load_audio(audio)
+        current_span().add(audio_seconds=audio.shape[0] / SAMPLE_RATE)
 
         def data(audio, segments):
             for seg in segments:
                 f1 = int(seg['start'] * SAMPLE_RATE)
                 f2 = int(seg['end'] * SAMPLE_RATE)
-                # print(f2-f1)
-                yield {'inputs': audio[f1:f2]}
+                yield audio[f1:f2]
 
-        vad_segments = self.vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE})
-        vad_segments = merge_chunks(vad_segments, chunk_size)
+        with span("vad", audio_seconds=audio.shape[0] / SAMPLE_RATE):
+            vad_segments = self.vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": SAMPLE_RATE})
+            vad_segments = merge_chunks(vad_segments, chunk_size)
 
         if self.tokenizer is None:
             language = language or self.detect_language(audio)
@@ -299,7 +368,7 @@ class FasterWhisperPipeline(Pipeline):
         batch_size = batch_size or self._batch_size
         total_segments = len(vad_segments)
 
-        for idx, out in enumerate(self.__call__(data(audio, vad_segments), batch_size=batch_size, num_workers=num_workers)):
+        for idx, text in enumerate(self(data(audio, vad_segments), batch_size=batch_size, num_workers=num_workers)):
             base_progress = ((idx + 1) / total_segments) * 100
             percent_complete = base_progress / 2 if combined_progress else base_progress
             progress_list.append(percent_complete)
@@ -309,10 +378,7 @@ class FasterWhisperPipeline(Pipeline):
 
             if progress_callback:
                 progress_callback(percent_complete)
-            
-            text = out['text']
-            if batch_size in [0, 1, None]:
-                text = text[0]
+
             segments.append({
                 "text": text,
                 "start": round(vad_segments[idx]['start'], 3),
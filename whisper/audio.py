@@ -7,6 +7,7 @@ import numpy as np
 import torch
 import torch.nn.functional as F
 
+from .metrics import current_span, timed
 from .utils import exact_div
 
 # hard-coded audio hyperparameters
@@ -23,7 +24,8 @@ FRAMES_PER_SECOND = exact_div(SAMPLE_RATE, HOP_LENGTH)  # 10ms per audio frame
 TOKENS_PER_SECOND = exact_div(SAMPLE_RATE, N_SAMPLES_PER_TOKEN)  # 20ms per audio token
 
 
-def load_audio(file: str, sr: int = SAMPLE_RATE):
+@timed("load_audio")
+def load_audio(file: str, sr: int = SAMPLE_RATE, start: Optional[float] = None, duration: Optional[float] = None):
     """
     Open an audio file and read as mono waveform, resampling as necessary
 
@@ -35,6 +37,12 @@ def load_audio(file: str, sr: int = SAMPLE_RATE):
     sr: int
         The sample rate to resample the audio if necessary
 
+    start: Optional[float]
+        If given, start decoding at this many seconds into the file
+
+    duration: Optional[float]
+        If given, decode at most this many seconds
+
     Returns
     -------
     A NumPy array containing the audio waveform, in float32 dtype.
@@ -42,15 +50,22 @@ def load_audio(file: str, sr: int = SAMPLE_RATE):
     try:
         # This launches a subprocess to decode audio while down-mixing and resampling as necessary.
         # Requires the ffmpeg CLI and `ffmpeg-python` package to be installed.
+        input_kwargs = {}
+        if start is not None:
+            input_kwargs["ss"] = start
+        if duration is not None:
+            input_kwargs["t"] = duration
         out, _ = (
-            ffmpeg.input(file, threads=0)
+            ffmpeg.input(file, threads=0, **input_kwargs)
             .output("-", format="s16le", acodec="pcm_s16le", ac=1, ar=sr)
             .run(cmd=["ffmpeg", "-nostdin"], capture_stdout=True, capture_stderr=True)
         )
     except ffmpeg.Error as e:
         raise RuntimeError(f"Failed to load audio: {e.stderr.decode()}") from e
 
-    return np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+    audio = np.frombuffer(out, np.int16).flatten().astype(np.float32) / 32768.0
+    current_span().add(audio_seconds=audio.shape[0] / sr)
+    return audio
 
 
 def pad_or_trim(array, length: int = N_SAMPLES, *, axis: int = -1):
@@ -97,11 +112,17 @@ def mel_filters(device, n_mels: int = N_MELS) -> torch.Tensor:
         return torch.from_numpy(f[f"mel_{n_mels}"]).to(device)
 
 
+@lru_cache(maxsize=None)
+def hann_window(device) -> torch.Tensor:
+    return torch.hann_window(N_FFT).to(device)
+
+
 def log_mel_spectrogram(
     audio: Union[str, np.ndarray, torch.Tensor],
     n_mels: int = N_MELS,
     padding: int = 0,
     device: Optional[Union[str, torch.device]] = None,
+    out: Optional[torch.Tensor] = None,
 ):
     """
     Compute the log-Mel spectrogram of
@@ -120,6 +141,9 @@ def log_mel_spectrogram(
     device: Optional[Union[str, torch.device]]
         If given, the audio tensor is moved to this device before STFT
 
+    out: Optional[torch.Tensor], shape = (80, n_frames)
+        If given, the spectrogram is written into this tensor instead of a new one
+
     Returns
     -------
     torch.Tensor, shape = (80, n_frames)
@@ -134,14 +158,14 @@ def log_mel_spectrogram(
         audio = audio.to(device)
     if padding > 0:
         audio = F.pad(audio, (0, padding))
-    window = torch.hann_window(N_FFT).to(audio.device)
+    window = hann_window(audio.device)
     stft = torch.stft(audio, N_FFT, HOP_LENGTH, window=window, return_complex=True)
-    magnitudes = stft[..., :-1].abs() ** 2
+    magnitudes = stft[..., :-1].abs().pow_(2)
 
     filters = mel_filters(audio.device, n_mels)
-    mel_spec = filters @ magnitudes
-
-    log_spec = torch.clamp(mel_spec, min=1e-10).log10()
-    log_spec = torch.maximum(log_spec, log_spec.max() - 8.0)
-    log_spec = (log_spec + 4.0) / 4.0
+    # the remaining steps work in place on the product, so no further intermediates are allocated
+    log_spec = torch.matmul(filters, magnitudes, out=out)
+    log_spec.clamp_(min=1e-10).log10_()
+    torch.maximum(log_spec, log_spec.max() - 8.0, out=log_spec)
+    log_spec.add_(4.0).div_(4.0)
     return log_spec
@@ -6,9 +6,22 @@ import torch
 from pathlib import Path
 import json
 import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
 from typing import Optional, Union
-import tempfile
 
+from .audio import SAMPLE_RATE, load_audio
+from .metrics import bind_job, span, timed
+from .speaker_index import rename_speakers
+from .transcript import Transcript, as_dict, npz_path, save_transcript
+
+# Recordings longer than this (in seconds) are diarized window by window to bound memory
+WINDOWED_DIARIZATION_THRESHOLD = 2 * 60 * 60
+# Window length of windowed diarization
+DIARIZATION_WINDOW = 1800.0
+# Shorter windows, e.g. the tail of a recording, may hold fewer speakers and get no min_speakers
+MIN_SPEAKERS_WINDOW = 300.0
 
 class DiarizationPipeline:
     def __init__(
@@ -28,13 +41,20 @@ class DiarizationPipeline:
                 print("Move Model To Device Error: \n", str(e))
                 pass
 
-    def __call__(self, audio: Union[str, np.ndarray], min_speakers=None, max_speakers=None, progress_callback=None):
-        # If audio is a string, it is a file path, use it directly
+    def __call__(self, audio: Union[str, np.ndarray], min_speakers=None, max_speakers=None, progress_callback=None,
+                 return_embeddings=False):
+        """
+        Diarize audio and return a DataFrame of speaker turns.
+        With return_embeddings, also return {speaker label: centroid embedding} (NaN-free speakers only).
+        """
+        # If audio is a string, it is a file path, decode it once here
         if isinstance(audio, str):
-            audio_file = audio
-        else:
-            # If it's a NumPy array, save it as a temporary file
-            audio_file = self.save_audio_to_tempfile(audio)
+            audio = load_audio(audio)
+        # Hand the decoded waveform to pyannote directly, no temporary file and no second decode
+        audio_file = {
+            "waveform": torch.from_numpy(audio[None, :]),
+            "sample_rate": SAMPLE_RATE
+        }
 
         # Define a ProgressHook class with callback
         class ProgressHookWithCallback(ProgressHook):
@@ -47,78 +67,359 @@ class DiarizationPipeline:
                 if self.callback:
                     self.callback(step_name, step_artifact, file, total, completed)
 
+        kwargs = {"min_speakers": min_speakers, "max_speakers": max_speakers}
+        if return_embeddings:
+            kwargs["return_embeddings"] = True
+
         # Use ProgressHook to display progress, passing the callback
-        if progress_callback:
-            with ProgressHookWithCallback(progress_callback) as hook:
-                segments = self.model(audio_file, min_speakers=min_speakers, max_speakers=max_speakers, hook=hook)
-        else:
-            segments = self.model(audio_file, min_speakers=min_speakers, max_speakers=max_speakers)
+        with span("diarize", audio_seconds=audio.shape[0] / SAMPLE_RATE):
+            if progress_callback:
+                with ProgressHookWithCallback(progress_callback) as hook:
+                    segments = self.model(audio_file, hook=hook, **kwargs)
+            else:
+                segments = self.model(audio_file, **kwargs)
+
+        speaker_embeddings = {}
+        if return_embeddings:
+            segments, embeddings = segments
+            # None without an embedding model (e.g. oracle mode); speakers then stay unlinked
+            if embeddings is not None:
+                for label, embedding in zip(segments.labels(), embeddings):
+                    if np.all(np.isfinite(embedding)):
+                        speaker_embeddings[label] = embedding
 
-        # Convert separated segments to DataFrame format
-        diarize_df = pd.DataFrame(segments.itertracks(yield_label=True))
-        diarize_df['start'] = diarize_df[0].apply(lambda x: x.start)
-        diarize_df['end'] = diarize_df[0].apply(lambda x: x.end)
-        diarize_df.rename(columns={2: "speaker"}, inplace=True)
+        # Convert separated segments to DataFrame format; no speech gives an empty frame
+        diarize_df = pd.DataFrame([(turn.start, turn.end, label)
+                                   for turn, _, label in segments.itertracks(yield_label=True)],
+                                  columns=["start", "end", "speaker"])
 
+        if return_embeddings:
+            return diarize_df, speaker_embeddings
         return diarize_df
 
-    def save_audio_to_tempfile(self, audio):
-        """Save audio data as a temporary file"""
-        with tempfile.NamedTemporaryFile(suffix=".wav", delete=False) as tmp_wav:
-            audio_file = tmp_wav.name
-            waveform = torch.from_numpy(audio[None, :])
-            torch.save(waveform, tmp_wav)
-        return audio_file
-    
-import numpy as np
+    def diarize_windowed(self, audio: Union[str, np.ndarray], window=DIARIZATION_WINDOW, overlap=60.0, link_threshold=0.5,
+                         min_speakers=None, max_speakers=None, progress_callback=None, return_embeddings=False):
+        """
+        Diarize long recordings window by window to bound memory.
+
+        Each window (with `overlap` seconds shared with the next one) is diarized on its own;
+        local speakers are linked to global speakers by cosine similarity of their centroid
+        embeddings (new global speaker below `link_threshold`). Turns are cut at the middle of
+        each overlap. If `audio` is a path, only one window is decoded at a time. `min_speakers`
+        is not applied to windows shorter than MIN_SPEAKERS_WINDOW. A local speaker without a
+        usable embedding becomes a global speaker of its own, never linked to other windows.
+        Returns a SpeakerTurns (and {global label: centroid} with return_embeddings).
+        """
+        assert 0 <= overlap < window
+        hop = window - overlap
+        starts, ends, speaker_ids = [], [], []
+        centroids, counts = [], []
+
+        offset = 0.0
+        while True:
+            if isinstance(audio, str):
+                chunk = load_audio(audio, start=offset, duration=window)
+            else:
+                chunk = audio[int(offset * SAMPLE_RATE):int((offset + window) * SAMPLE_RATE)]
+            if chunk.shape[0] == 0:
+                break
+            is_last = chunk.shape[0] < int(window * SAMPLE_RATE) or (
+                not isinstance(audio, str) and int((offset + window) * SAMPLE_RATE) >= audio.shape[0])
+
+            window_min_speakers = min_speakers if chunk.shape[0] >= MIN_SPEAKERS_WINDOW * SAMPLE_RATE else None
+            local_df, local_embeddings = self(chunk, min_speakers=window_min_speakers, max_speakers=max_speakers,
+                                              progress_callback=progress_callback, return_embeddings=True)
+            local_to_global = self._link_speakers(local_embeddings, centroids, counts, link_threshold)
+            for label in local_df["speaker"].unique():
+                if label not in local_to_global:
+                    # no embedding to link it by; None keeps it out of later matching
+                    local_to_global[label] = len(centroids)
+                    centroids.append(None)
+                    counts.append(0)
+
+            # keep this window's turns between the middles of its overlaps with the neighbours
+            keep_from = offset + overlap / 2 if offset > 0 else 0.0
+            keep_to = offset + window - overlap / 2 if not is_last else float("inf")
+            if len(local_df):
+                turn_starts = np.maximum(local_df["start"].to_numpy() + offset, keep_from)
+                turn_ends = np.minimum(local_df["end"].to_numpy() + offset, keep_to)
+                for start, end, label in zip(turn_starts, turn_ends, local_df["speaker"]):
+                    if end > start:
+                        starts.append(start)
+                        ends.append(end)
+                        speaker_ids.append(local_to_global[label])
+
+            if is_last:
+                break
+            offset += hop
+
+        labels = [f"SPEAKER_{i:02d}" for i in range(len(centroids))]
+        turns = SpeakerTurns(starts, ends, speaker_ids, labels)
+        if return_embeddings:
+            return turns, {label: centroid for label, centroid in zip(labels, centroids) if centroid is not None}
+        return turns
+
+    @staticmethod
+    def _link_speakers(local_embeddings, centroids, counts, link_threshold):
+        """Map local speaker labels to global ids, updating the global centroids in place"""
+        local_labels = list(local_embeddings)
+        mapping = {}
+        if not local_labels:
+            return mapping
+        queries = np.stack([local_embeddings[label] for label in local_labels]).astype(np.float32)
+        queries /= np.maximum(np.linalg.norm(queries, axis=1, keepdims=True), 1e-12)
+
+        # speakers kept without an embedding (None) are never linked
+        linkable = [j for j, centroid in enumerate(centroids) if centroid is not None]
+        if linkable:
+            similarity = queries @ np.stack([centroids[j] for j in linkable]).T
+        else:
+            similarity = np.zeros((len(local_labels), 0))
+        # greedy one-to-one matching, most similar pairs first
+        taken = set()
+        for flat in np.argsort(-similarity, axis=None):
+            i, k = np.unravel_index(flat, similarity.shape)
+            if similarity[i, k] < link_threshold:
+                break
+            j = linkable[k]
+            if local_labels[i] in mapping or j in taken:
+                continue
+            mapping[local_labels[i]] = j
+            taken.add(j)
+
+        for i, label in enumerate(local_labels):
+            if label in mapping:
+                j = mapping[label]
+                total = centroids[j] * counts[j] + queries[i]
+                centroids[j] = total / max(np.linalg.norm(total), 1e-12)
+                counts[j] += 1
+            else:
+                mapping[label] = len(centroids)
+                centroids.append(queries[i])
+                counts.append(1)
+        return mapping
+
+
+class SpeakerTurns:
+    """
+    Compact array-backed list of diarization turns.
+
+    start/end are float32 seconds and speaker an int16 id into `labels`. Indexing by column
+    ("start", "end", "speaker") returns arrays, so it can be passed wherever the diarization
+    DataFrame is used for speaker assignment.
+    """
+
+    def __init__(self, starts, ends, speaker_ids, labels):
+        self.starts = np.asarray(starts, dtype=np.float32)
+        self.ends = np.asarray(ends, dtype=np.float32)
+        self.speaker_ids = np.asarray(speaker_ids, dtype=np.int16)
+        self.labels = np.asarray(labels, dtype=str)
+
+    def __len__(self):
+        return len(self.starts)
+
+    def __getitem__(self, column):
+        if column == "start":
+            return self.starts
+        if column == "end":
+            return self.ends
+        if column == "speaker":
+            return self.labels[self.speaker_ids] if len(self.labels) else np.zeros(0, dtype=str)
+        raise KeyError(column)
+
+    def to_dataframe(self):
+        return pd.DataFrame({"start": self.starts, "end": self.ends, "speaker": self["speaker"]})
 
+_pipeline_cache = {}
+_pipeline_cache_lock = threading.Lock()
+
+def get_diarization_pipeline(model_name="pyannote/speaker-diarization", use_auth_token=None, device="cpu", cache_dir=None):
+    """
+    Return a DiarizationPipeline shared per (model_name, device, token).
+
+    The pipeline is loaded on first use (hub resolution, weights, move to device) and reused
+    by every later run in the process. Concurrent callers wait for a load already in progress.
+    """
+    key = (model_name, str(torch.device(device)), use_auth_token)
+    with _pipeline_cache_lock:
+        if key not in _pipeline_cache:
+            pipeline = DiarizationPipeline(model_name, use_auth_token=use_auth_token, device=device, cache_dir=cache_dir)
+            if not pipeline.model:
+                raise ValueError(f"Failed to load diarization pipeline {model_name}, please check the Hugging Face token.")
+            _pipeline_cache[key] = pipeline
+        return _pipeline_cache[key]
+
+def _sorted_with_prefix_sums(values):
+    values = np.sort(values)
+    return values, np.concatenate(([0.0], np.cumsum(values)))
+
+def assign_speakers_to_intervals(diarize_df, starts, ends, fill_nearest=False):
+    """
+    Pick the speaker with the largest total overlap for every [start, end] interval.
+
+    Equivalent to summing `min(turn.end, end) - max(turn.start, start)` per speaker over the
+    diarization turns (only positive overlaps unless `fill_nearest`), but each speaker's turn
+    starts and ends are sorted once and every interval is resolved with binary searches on
+    prefix sums, i.e. O((n + m) log m) instead of one DataFrame pass per interval.
+    Ties go to the first speaker in sorted label order. Returns an object array with None
+    where no speaker overlaps.
+    """
+    starts = np.asarray(starts, dtype=np.float64)
+    ends = np.asarray(ends, dtype=np.float64)
+    labels = np.full(len(starts), None, dtype=object)
+    if len(diarize_df) == 0 or len(starts) == 0:
+        return labels
+
+    turn_starts = np.asarray(diarize_df["start"], dtype=np.float64)
+    turn_ends = np.asarray(diarize_df["end"], dtype=np.float64)
+    turn_speakers = np.asarray(diarize_df["speaker"])
+    if not fill_nearest:
+        # a turn can only overlap an interval by more than zero if it has a positive length
+        positive = turn_ends > turn_starts
+        turn_starts, turn_ends, turn_speakers = turn_starts[positive], turn_ends[positive], turn_speakers[positive]
+        if len(turn_starts) == 0:
+            return labels
+
+    speakers = np.unique(turn_speakers)
+    scores = np.empty((len(speakers), len(starts)), dtype=np.float64)
+    present = np.ones((len(speakers), len(starts)), dtype=bool)
+    valid = starts < ends
+
+    for k, speaker in enumerate(speakers):
+        selected = turn_speakers == speaker
+        sorted_starts, start_sums = _sorted_with_prefix_sums(turn_starts[selected])
+        sorted_ends, end_sums = _sorted_with_prefix_sums(turn_ends[selected])
+        num_turns = len(sorted_starts)
+
+        starts_le_start = np.searchsorted(sorted_starts, starts, "right")
+        ends_lt_end = np.searchsorted(sorted_ends, ends, "left")
+        if fill_nearest:
+            sum_min_end = end_sums[ends_lt_end] + ends * (num_turns - ends_lt_end)
+            sum_max_start = starts * starts_le_start + (start_sums[-1] - start_sums[starts_le_start])
+            scores[k] = sum_min_end - sum_max_start
+            continue
+
+        # overlapping turns are those with turn.start < end, minus those with turn.end <= start
+        starts_lt_end = np.searchsorted(sorted_starts, ends, "left")
+        ends_le_start = np.searchsorted(sorted_ends, starts, "right")
+        sum_min_end = end_sums[ends_lt_end] + ends * (starts_lt_end - ends_lt_end)
+        sum_max_start = starts * starts_le_start + start_sums[starts_lt_end] - start_sums[starts_le_start]
+        sum_before = end_sums[ends_le_start] - starts * ends_le_start
+        scores[k] = sum_min_end - sum_max_start - sum_before
+        present[k] = valid & (starts_lt_end > ends_le_start)
+
+    # prefix sums carry rounding error, so settle exact ties by label order like a direct sum would
+    scores = np.round(scores, 9)
+    scores[~present] = -np.inf
+    assigned = present.any(axis=0)
+    labels[assigned] = speakers[np.argmax(scores[:, assigned], axis=0)]
+    return labels
+
+@timed("assign_speakers")
 def assign_word_speakers(diarize_df, transcript_result, fill_nearest=False, progress_callback=None):
+    if isinstance(transcript_result, Transcript):
+        # columnar transcript: segments and timed words are assigned straight from the arrays
+        timed = ~np.isnan(transcript_result.word_starts)
+        word_labels = np.full(transcript_result.num_words, None, dtype=object)
+        word_labels[timed] = assign_speakers_to_intervals(diarize_df, transcript_result.word_starts[timed],
+                                                          transcript_result.word_ends[timed], fill_nearest=fill_nearest)
+        segment_labels = assign_speakers_to_intervals(diarize_df, transcript_result.starts, transcript_result.ends,
+                                                      fill_nearest=fill_nearest)
+        transcript_result.set_speakers(segment_labels, word_labels)
+        if progress_callback:
+            progress_callback(100)
+        return transcript_result
+
     transcript_segments = transcript_result["segments"]
     total_segments = len(transcript_segments)
-    
+
+    # Resolve segments and timed words in a single pass over the diarization turns
+    starts, ends, targets = [], [], []
     for i, seg in enumerate(transcript_segments):
         # Update overall progress
         if progress_callback:
             progress_callback((i / total_segments) * 100)
 
-        # Assign speaker to segment (if any)
-        diarize_df['intersection'] = np.minimum(diarize_df['end'], seg['end']) - np.maximum(diarize_df['start'], seg['start'])
-        diarize_df['union'] = np.maximum(diarize_df['end'], seg['end']) - np.minimum(diarize_df['start'], seg['start'])
+        starts.append(seg["start"])
+        ends.append(seg["end"])
+        targets.append(seg)
+        for word in seg.get("words", []):
+            if "start" in word:
+                starts.append(word["start"])
+                ends.append(word["end"])
+                targets.append(word)
+    speakers = assign_speakers_to_intervals(diarize_df, starts, ends, fill_nearest=fill_nearest)
 
-        if not fill_nearest:
-            dia_tmp = diarize_df[diarize_df['intersection'] > 0]
-        else:
-            dia_tmp = diarize_df
-        if len(dia_tmp) > 0:
-            speaker = dia_tmp.groupby("speaker")["intersection"].sum().sort_values(ascending=False).index[0]
-            seg["speaker"] = speaker
-        
-        # Assign speaker to words
-        if 'words' in seg:
-            total_words = len(seg['words'])
-            for j, word in enumerate(seg['words']):
-                # Update progress for each word
-                if progress_callback:
-                    segment_progress = (j / total_words) * (100 / total_segments)
-                    progress_callback(((i / total_segments) * 100) + segment_progress)
-
-                if 'start' in word:
-                    diarize_df['intersection'] = np.minimum(diarize_df['end'], word['end']) - np.maximum(diarize_df['start'], word['start'])
-                    diarize_df['union'] = np.maximum(diarize_df['end'], word['end']) - np.minimum(diarize_df['start'], word['start'])
-
-                    if not fill_nearest:
-                        dia_tmp = diarize_df[diarize_df['intersection'] > 0]
-                    else:
-                        dia_tmp = diarize_df
-                    if len(dia_tmp) > 0:
-                        speaker = dia_tmp.groupby("speaker")["intersection"].sum().sort_values(ascending=False).index[0]
-                        word["speaker"] = speaker
+    for target, speaker in zip(targets, speakers):
+        if speaker is not None:
+            target["speaker"] = speaker
 
     if progress_callback:
         progress_callback(100)  # Ensure progress reaches 100% upon completion
 
     return transcript_result
 
+def split_thread_budget(diarization_share=0.5):
+    """
+    Split the CPU cores between Whisper decoding (CTranslate2 `cpu_threads`) and torch.
+
+    Only CTranslate2 gets a budget of its own. torch's intra-op thread count is process-wide,
+    so the torch share is used by diarization and by the torch work of ASR (VAD, log-Mel
+    features) alike.
+    """
+    cores = os.cpu_count() or 1
+    diarization_threads = max(1, int(round(cores * diarization_share)))
+    asr_threads = max(1, cores - diarization_threads)
+    return asr_threads, diarization_threads
+
+def transcribe_and_diarize(asr_model, diarize_model, audio, batch_size=None, diarization_threads=None,
+                           min_speakers=None, max_speakers=None, fill_nearest=False, speaker_index=None,
+                           diarization_threshold=WINDOWED_DIARIZATION_THRESHOLD, diarization_window=DIARIZATION_WINDOW,
+                           asr_progress_callback=None, diarization_progress_callback=None,
+                           assign_progress_callback=None):
+    """
+    Run Whisper transcription and pyannote diarization concurrently on the same decoded audio.
+
+    Diarization runs in a worker thread while ASR runs in the calling thread; both spend their
+    time in native code (CTranslate2 / torch) that releases the GIL. Whisper decoding uses the
+    `cpu_threads` the model was loaded with. `diarization_threads` sets torch's intra-op thread
+    count for the duration of the job; that setting is process-wide, so it also applies to the
+    VAD and feature extraction of the ASR side, and to any other torch work in the process.
+    Both results are joined for speaker assignment.
+
+    Recordings longer than `diarization_threshold` seconds (None: never) are diarized in windows
+    of `diarization_window` seconds (see DiarizationPipeline.diarize_windowed) to bound memory.
+
+    Per-speaker centroid embeddings are stored under "speaker_embeddings" in the result; with a
+    `speaker_index` (whisper.speaker_index.SpeakerIndex), enrolled voices get their names as labels.
+    """
+    if isinstance(audio, str):
+        audio = load_audio(audio)
+
+    # process-wide, see above
+    previous_threads = torch.get_num_threads()
+    if diarization_threads:
+        torch.set_num_threads(diarization_threads)
+    try:
+        with ThreadPoolExecutor(max_workers=1, thread_name_prefix="diarization") as pool:
+            diarize = diarize_model
+            if diarization_threshold and audio.shape[0] > diarization_threshold * SAMPLE_RATE:
+                diarize = partial(diarize_model.diarize_windowed, window=diarization_window)
+            diarization = pool.submit(bind_job(diarize), audio, min_speakers=min_speakers, max_speakers=max_speakers,
+                                      progress_callback=diarization_progress_callback, return_embeddings=True)
+            transcription_result = asr_model.transcribe(audio, batch_size=batch_size,
+                                                        progress_callback=asr_progress_callback)
+            diarize_df, speaker_embeddings = diarization.result()
+    finally:
+        torch.set_num_threads(previous_threads)
+
+    result = assign_word_speakers(diarize_df, Transcript.from_dict(transcription_result), fill_nearest=fill_nearest,
+                                  progress_callback=assign_progress_callback)
+    result["speaker_embeddings"] = {label: e.tolist() for label, e in speaker_embeddings.items()}
+    if speaker_index is not None:
+        rename_speakers(result, speaker_index.identify(speaker_embeddings))
+    return result
+
 def save_transcription_with_speakers(transcription_result, output_dir="temp/text", output_file="transcription_diarized.json"):
     # Create output directory
     Path(output_dir).mkdir(parents=True, exist_ok=True)
@@ -128,7 +429,9 @@ def save_transcription_with_speakers(transcription_result, output_dir="temp/text
 
     # Save result as JSON
     with open(file_path, "w", encoding="utf-8") as f:
-        json.dump(transcription_result, f, ensure_ascii=False, indent=4)
+        json.dump(as_dict(transcription_result), f, ensure_ascii=False, indent=4)
+    # Binary columnar copy for fast, memory-mapped loading
+    save_transcript(transcription_result, npz_path(file_path))
 
     print(f"Transcription and speaker diarization saved to: {file_path}")
 
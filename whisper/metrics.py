@@ -0,0 +1,292 @@
+"""
+Per-stage timing and memory metrics of transcription and summary jobs.
+
+Set PIPELINE_METRICS=1 to have every job append a record to metrics.json in its result folder:
+one entry per span (ffmpeg extraction, audio decoding, VAD, encoding, decoding, diarization,
+speaker assignment, LLM requests, ...) with wall time, CPU time, RSS change and the seconds of
+audio processed, plus totals per stage.
+
+Spans go to the job bound to the current context, so concurrent jobs of one process (two Gradio
+sessions, a summary next to a transcription) keep their records apart. Threads do not inherit
+the binding: wrap the tasks of worker pools with bind_job, or bind a job with use_job. Without a
+bound job span() returns a shared no-op object.
+
+    with metrics_job("result/meeting", "speech2text"):
+        with span("load_audio") as s:
+            audio = decode(...)
+            s.add(audio_seconds=len(audio) / SAMPLE_RATE)
+"""
+import contextvars
+import functools
+import json
+import os
+import sys
+import threading
+import time
+from contextlib import contextmanager
+
+METRICS_ENV = "PIPELINE_METRICS"
+METRICS_FILE = "metrics.json"
+# Records of older jobs beyond this many are dropped from metrics.json
+MAX_JOBS = 20
+
+_job = contextvars.ContextVar("metrics_job", default=None)
+# open spans per thread, innermost last, for current_span()
+_local = threading.local()
+
+def metrics_enabled():
+    return os.environ.get(METRICS_ENV, "").lower() in ("1", "true", "yes")
+
+def rss_bytes():
+    """Resident memory of the process; the peak where the current value is not available"""
+    try:
+        with open("/proc/self/statm", "rb") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError, AttributeError):
+        pass
+    try:
+        # Unix only
+        import resource
+    except ImportError:
+        return 0
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if sys.platform == "darwin" else peak * 1024
+
+def _open_spans():
+    spans = getattr(_local, "spans", None)
+    if spans is None:
+        spans = _local.spans = []
+    return spans
+
+class Span:
+    """Measures one stage and reports it to its job when the block exits"""
+    __slots__ = ("name", "job", "audio_seconds", "_stack", "_started", "_wall", "_cpu", "_process_cpu", "_rss")
+
+    def __init__(self, name, job, audio_seconds=None):
+        self.name = name
+        self.job = job
+        self.audio_seconds = audio_seconds
+
+    def add(self, audio_seconds=None):
+        """Count audio processed within the span, e.g. once it is known after decoding"""
+        if audio_seconds is not None:
+            self.audio_seconds = (self.audio_seconds or 0.0) + audio_seconds
+
+    def __enter__(self):
+        self._stack = _open_spans()
+        self._stack.append(self)
+        self._started = time.time()
+        self._rss = rss_bytes()
+        self._process_cpu = time.process_time()
+        self._cpu = time.thread_time()
+        self._wall = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        record = {
+            "name": self.name,
+            "started": self._started,
+            "wall": round(wall, 6),
+            # CPU of the span's thread, and of the whole process (includes concurrent stages)
+            "cpu": round(time.thread_time() - self._cpu, 6),
+            "process_cpu": round(time.process_time() - self._process_cpu, 6),
+            "rss_delta_mb": round((rss_bytes() - self._rss) / 2 ** 20, 2),
+            "thread": threading.current_thread().name,
+        }
+        if self.audio_seconds is not None:
+            record["audio_seconds"] = round(self.audio_seconds, 3)
+        if exc_type is not None:
+            record["error"] = exc_type.__name__
+        # a generator's span may close on another thread than it opened on
+        if self in self._stack:
+            self._stack.remove(self)
+        self.job.add(record)
+        return False
+
+class _NullSpan:
+    __slots__ = ()
+
+    def add(self, audio_seconds=None):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        return False
+
+NULL_SPAN = _NullSpan()
+
+def span(name, audio_seconds=None):
+    """A Span of the current job, otherwise the shared no-op span"""
+    job = _job.get()
+    if job is None:
+        return NULL_SPAN
+    return Span(name, job, audio_seconds)
+
+def current_span():
+    """Innermost open span of this thread, e.g. to add the audio a @timed function processed"""
+    spans = getattr(_local, "spans", None)
+    return spans[-1] if spans else NULL_SPAN
+
+def timed(name):
+    """Decorator running the whole function in span(name)"""
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            job = _job.get()
+            if job is None:
+                return function(*args, **kwargs)
+            with Span(name, job):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorator
+
+class MetricsJob:
+    """Spans recorded while one job runs, saved to <output_dir>/metrics.json when it finishes"""
+
+    def __init__(self, output_dir, kind):
+        self.path = os.path.join(output_dir, METRICS_FILE)
+        self.kind = kind
+        self.spans = []
+        self.finished = False
+        self._lock = threading.Lock()
+        self._started = time.time()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._rss = rss_bytes()
+
+    def add(self, record):
+        record = dict(record, start=round(record["started"] - self._started, 3))
+        del record["started"]
+        with self._lock:
+            if not self.finished:
+                self.spans.append(record)
+
+    def summary(self, error=None):
+        totals = {}
+        with self._lock:
+            spans = list(self.spans)
+        for record in spans:
+            total = totals.setdefault(record["name"], {"count": 0, "wall": 0.0, "cpu": 0.0, "rss_delta_mb": 0.0})
+            total["count"] += 1
+            total["wall"] += record["wall"]
+            total["cpu"] += record["cpu"]
+            total["rss_delta_mb"] += record["rss_delta_mb"]
+            if "audio_seconds" in record:
+                total["audio_seconds"] = total.get("audio_seconds", 0.0) + record["audio_seconds"]
+        for total in totals.values():
+            for key in ("wall", "cpu", "rss_delta_mb", "audio_seconds"):
+                if key in total:
+                    total[key] = round(total[key], 3)
+            if total.get("audio_seconds"):
+                total["rtf"] = round(total["wall"] / total["audio_seconds"], 4)
+
+        job = {
+            "kind": self.kind,
+            "started": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self._started)),
+            "wall": round(time.perf_counter() - self._wall, 3),
+            "process_cpu": round(time.process_time() - self._cpu, 3),
+            "rss_delta_mb": round((rss_bytes() - self._rss) / 2 ** 20, 2),
+            "totals": totals,
+            "spans": spans,
+        }
+        if error is not None:
+            job["error"] = error
+        return job
+
+    def finish(self, error=None):
+        """Stop collecting and append this job to metrics.json"""
+        job = self.summary(error)
+        with self._lock:
+            if self.finished:
+                return
+            self.finished = True
+        try:
+            jobs = []
+            if os.path.exists(self.path):
+                with open(self.path, "r", encoding="utf-8") as f:
+                    jobs = json.load(f).get("jobs", [])
+            jobs = (jobs + [job])[-MAX_JOBS:]
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "w", encoding="utf-8") as f:
+                json.dump({"jobs": jobs}, f, ensure_ascii=False, indent=2)
+            print(f"Job metrics saved to {self.path}")
+        except Exception as e:
+            print(f"Error writing job metrics {self.path}: {e}")
+
+def start_job(output_dir, kind):
+    """
+    A MetricsJob if PIPELINE_METRICS is set, otherwise None. The job records nothing until it
+    is bound with use_job (or started with metrics_job).
+    """
+    if not metrics_enabled():
+        return None
+    return MetricsJob(output_dir, kind)
+
+def finish_job(job, error=None):
+    if job is not None:
+        job.finish(error)
+
+@contextmanager
+def use_job(job):
+    """Record the spans of the enclosed block, in this thread, into `job` (a MetricsJob or None)"""
+    token = _job.set(job)
+    try:
+        yield job
+    finally:
+        _job.reset(token)
+
+def bind_job(function):
+    """Wrap a function to run in the caller's current job, e.g. as the task of a worker thread"""
+    job = _job.get()
+    if job is None:
+        return function
+
+    @functools.wraps(function)
+    def wrapper(*args, **kwargs):
+        with use_job(job):
+            return function(*args, **kwargs)
+    return wrapper
+
+@contextmanager
+def metrics_job(output_dir, kind):
+    """Collect the spans of the enclosed block as one job of `kind` (None when metrics are off)"""
+    job = start_job(output_dir, kind)
+    error = None
+    try:
+        with use_job(job):
+            yield job
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        finish_job(job, error)
+
+def iterate_in_job(output_dir, kind, iterable):
+    """
+    Iterate over `iterable` as one job. The job is bound only while the next item is computed,
+    so this also works for generators whose consumer resumes them from different threads or
+    contexts, like Gradio's streaming handlers.
+    """
+    job = start_job(output_dir, kind)
+    error = None
+    iterator = iter(iterable)
+    try:
+        while True:
+            with use_job(job):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+    except Exception as e:
+        error = type(e).__name__
+        raise
+    finally:
+        # an abandoned generator closes its open spans before the job is written
+        if hasattr(iterator, "close"):
+            with use_job(job):
+                iterator.close()
+        finish_job(job, error)
@@ -0,0 +1,45 @@
+"""
+Deferred setup of the heavy speech stack for the apps.
+
+torch, faster-whisper and pyannote take seconds to import, so the apps import
+them on first use (the first transcription or diarization) instead of at startup.
+"""
+import threading
+from functools import lru_cache
+
+@lru_cache(maxsize=None)
+def init_torch():
+    """Import torch and apply the apps' global settings once; returns the torch module"""
+    import torch
+
+    torch.backends.cuda.matmul.allow_tf32 = False
+    torch.backends.cudnn.allow_tf32 = False
+    return torch
+
+@lru_cache(maxsize=None)
+def cuda_available():
+    available = init_torch().cuda.is_available()
+    print(f"CUDA available: {available}")
+    return available
+
+def default_device():
+    return "cuda" if cuda_available() else "cpu"
+
+def preload_diarization_pipeline(use_auth_token, device=None, cache_dir=None):
+    """
+    Import and load the shared diarization pipeline in a background thread, e.g. at app start.
+
+    device defaults to CUDA if available, decided in the background thread as well.
+    """
+    def preload():
+        try:
+            from whisper.diarize import get_diarization_pipeline
+
+            get_diarization_pipeline(use_auth_token=use_auth_token, device=device or default_device(),
+                                     cache_dir=cache_dir)
+        except Exception as e:
+            print(f"Error preloading diarization pipeline: {e}")
+
+    thread = threading.Thread(target=preload, name="diarization-preload", daemon=True)
+    thread.start()
+    return thread
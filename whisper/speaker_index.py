@@ -0,0 +1,211 @@
+"""
+On-disk index of enrolled voices, used to turn anonymous diarization labels
+(SPEAKER_00, ...) into names across recurring meetings.
+
+Enroll a speaker from a diarized transcript:
+
+    python -m whisper.speaker_index enroll "result/<video>/transcription_diarized.json" SPEAKER_00 "Alice"
+    python -m whisper.speaker_index list
+"""
+import argparse
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+DEFAULT_INDEX_PATH = os.path.join("speakers", "index.npz")
+
+
+def _normalize(x: np.ndarray) -> np.ndarray:
+    x = np.asarray(x, dtype=np.float32)
+    norms = np.linalg.norm(x, axis=-1, keepdims=True)
+    return x / np.maximum(norms, 1e-12)
+
+
+class ProductQuantizer:
+    """Product quantization of unit vectors for approximate inner-product search.
+
+    Each vector is split into `num_subspaces` parts, each part is replaced by the id of its
+    nearest centroid (uint8 codes). Queries are scored with one lookup table per subspace.
+    """
+
+    def __init__(self, num_subspaces: int = 8, num_centroids: int = 256, codebooks: Optional[np.ndarray] = None):
+        assert num_centroids <= 256
+        self.num_subspaces = num_subspaces
+        self.num_centroids = num_centroids
+        self.codebooks = codebooks  # (num_subspaces, num_centroids, sub_dim)
+
+    def _split(self, x: np.ndarray) -> np.ndarray:
+        if x.shape[-1] % self.num_subspaces:
+            raise ValueError(f"Embedding dimension {x.shape[-1]} is not divisible by the {self.num_subspaces} "
+                             f"product quantization subspaces")
+        return x.reshape(x.shape[0], self.num_subspaces, -1)
+
+    def fit(self, x: np.ndarray, iterations: int = 20, seed: int = 0):
+        parts = self._split(x)
+        rng = np.random.default_rng(seed)
+        k = min(self.num_centroids, x.shape[0])
+        codebooks = []
+        for m in range(self.num_subspaces):
+            data = parts[:, m]
+            centroids = data[rng.choice(data.shape[0], k, replace=False)]
+            for _ in range(iterations):
+                assignment = np.argmin(((data[:, None] - centroids[None]) ** 2).sum(-1), axis=1)
+                for c in range(k):
+                    members = data[assignment == c]
+                    if len(members):
+                        centroids[c] = members.mean(axis=0)
+            codebooks.append(centroids)
+        self.codebooks = np.stack(codebooks).astype(np.float32)
+        return self
+
+    def encode(self, x: np.ndarray) -> np.ndarray:
+        parts = self._split(x)
+        distances = ((parts[:, :, None, :] - self.codebooks[None]) ** 2).sum(-1)
+        return np.argmin(distances, axis=-1).astype(np.uint8)
+
+    def inner_products(self, queries: np.ndarray, codes: np.ndarray) -> np.ndarray:
+        # tables[q, m, c] = <query part m, centroid c of subspace m>
+        tables = np.einsum("qmd,mcd->qmc", self._split(queries), self.codebooks)
+        return tables[:, np.arange(self.num_subspaces)[None, :], codes.astype(np.int64)].sum(axis=-1)
+
+
+class SpeakerIndex:
+    """Enrolled speaker names with one L2-normalized centroid embedding each.
+
+    `identify` resolves all speakers of a meeting with a single matrix product, so the
+    per-meeting cost stays constant as the set of enrolled voices grows. With `use_pq`,
+    search runs on product-quantized codes instead of the float matrix.
+    """
+
+    def __init__(self, path: str = DEFAULT_INDEX_PATH, threshold: float = 0.6, use_pq: bool = False):
+        self.path = path
+        self.threshold = threshold
+        self.use_pq = use_pq
+        self.names = []
+        self.embeddings = np.zeros((0, 0), dtype=np.float32)
+        self.counts = np.zeros(0, dtype=np.int32)
+        self.quantizer = None
+        self.codes = None
+        if os.path.isfile(path):
+            self.load()
+
+    def __len__(self):
+        return len(self.names)
+
+    def load(self):
+        with np.load(self.path) as data:
+            self.names = [str(name) for name in data["names"]]
+            self.embeddings = data["embeddings"].astype(np.float32)
+            self.counts = data["counts"].astype(np.int32)
+            if "codebooks" in data:
+                self.quantizer = ProductQuantizer(*data["codebooks"].shape[:2], codebooks=data["codebooks"])
+                self.codes = data["codes"]
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        arrays = {"names": np.array(self.names, dtype=str), "embeddings": self.embeddings, "counts": self.counts}
+        if self.use_pq and len(self.names):
+            self.build_pq()
+            arrays.update(codebooks=self.quantizer.codebooks, codes=self.codes)
+        with open(self.path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(self.path + ".tmp", self.path)
+
+    def build_pq(self, num_subspaces: int = 8):
+        self.quantizer = ProductQuantizer(num_subspaces).fit(self.embeddings)
+        self.codes = self.quantizer.encode(self.embeddings)
+
+    def enroll(self, name: str, embedding: np.ndarray):
+        """Add a voice, or fold another sample of an enrolled voice into its centroid"""
+        embedding = _normalize(embedding)
+        if name in self.names:
+            i = self.names.index(name)
+            total = self.embeddings[i] * self.counts[i] + embedding
+            self.embeddings[i] = _normalize(total)
+            self.counts[i] += 1
+        else:
+            if len(self.names) == 0:
+                self.embeddings = np.zeros((0, embedding.shape[0]), dtype=np.float32)
+            self.names.append(name)
+            self.embeddings = np.vstack([self.embeddings, embedding[None]])
+            self.counts = np.append(self.counts, 1).astype(np.int32)
+        self.quantizer = self.codes = None
+
+    def identify(self, speaker_embeddings: Dict[str, np.ndarray]) -> Dict[str, str]:
+        """Map diarization labels to enrolled names; unknown voices keep their label"""
+        labels = [label for label, e in speaker_embeddings.items() if e is not None and np.all(np.isfinite(e))]
+        if not labels or len(self.names) == 0:
+            return {}
+
+        queries = _normalize(np.stack([speaker_embeddings[label] for label in labels]))
+        if self.use_pq and self.quantizer is not None:
+            similarity = self.quantizer.inner_products(queries, self.codes)
+        else:
+            similarity = queries @ self.embeddings.T
+        best = np.argmax(similarity, axis=1)
+        score = similarity[np.arange(len(labels)), best]
+
+        # each enrolled name goes to at most one label, the most similar one
+        mapping = {}
+        for i in np.argsort(-score):
+            name = self.names[best[i]]
+            if score[i] >= self.threshold and name not in mapping.values():
+                mapping[labels[i]] = name
+        return mapping
+
+
+def rename_speakers(transcription_result: dict, mapping: Dict[str, str]) -> dict:
+    """Replace diarization labels in segments, words and speaker embeddings in place"""
+    if not mapping:
+        return transcription_result
+    if hasattr(transcription_result, "rename_speakers"):
+        # columnar Transcript: labels live in one list
+        transcription_result.rename_speakers(mapping)
+        transcription_result["speaker_embeddings"] = {
+            mapping.get(label, label): e for label, e in transcription_result["speaker_embeddings"].items()
+        }
+        return transcription_result
+    for seg in transcription_result["segments"]:
+        if "speaker" in seg:
+            seg["speaker"] = mapping.get(seg["speaker"], seg["speaker"])
+        for word in seg.get("words", []):
+            if "speaker" in word:
+                word["speaker"] = mapping.get(word["speaker"], word["speaker"])
+    if "speaker_embeddings" in transcription_result:
+        transcription_result["speaker_embeddings"] = {
+            mapping.get(label, label): e for label, e in transcription_result["speaker_embeddings"].items()
+        }
+    return transcription_result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--index", default=DEFAULT_INDEX_PATH)
+    parser.add_argument("--pq", action="store_true", help="store product-quantized codes for search")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    enroll = subparsers.add_parser("enroll", help="enroll a speaker of a diarized transcript")
+    enroll.add_argument("transcription", help="transcription JSON with speaker_embeddings")
+    enroll.add_argument("label", help="speaker label in that transcript, e.g. SPEAKER_00")
+    enroll.add_argument("name", help="name to enroll the voice as")
+    subparsers.add_parser("list", help="list enrolled speakers")
+    args = parser.parse_args()
+
+    index = SpeakerIndex(args.index, use_pq=args.pq)
+    if args.command == "list":
+        for name, count in zip(index.names, index.counts):
+            print(f"{name}\t{count} sample(s)")
+        return
+
+    with open(args.transcription, "r", encoding="utf-8") as f:
+        embeddings = json.load(f).get("speaker_embeddings", {})
+    if args.label not in embeddings:
+        raise SystemExit(f"No embedding for {args.label} in {args.transcription}")
+    index.enroll(args.name, np.array(embeddings[args.label], dtype=np.float32))
+    index.save()
+    print(f"Enrolled {args.label} as {args.name} ({len(index)} speakers in {args.index})")
+
+
+if __name__ == "__main__":
+    main()
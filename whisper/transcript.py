@@ -0,0 +1,393 @@
+"""
+Columnar transcript container and its binary on-disk format.
+
+Besides transcription.json, a transcript can be stored as an uncompressed .npz next to it
+(transcription.npz): one .npy member per column plus all text as a single UTF-8 blob. Loading
+memory-maps the members, so a reader only pages in the columns it touches. Convert or export
+existing results with:
+
+    python -m whisper.transcript convert result/            # every transcription*.json -> .npz
+    python -m whisper.transcript convert "result/<video>/transcription.npz"   # back to .json
+    python -m whisper.transcript export "result/<video>/transcription.npz" --format srt
+"""
+import argparse
+import json
+import os
+import struct
+import zipfile
+from collections.abc import Mapping, Sequence
+from typing import List, Optional
+
+import numpy as np
+
+NO_SPEAKER = -1
+FORMAT_VERSION = 1
+
+# numeric columns of the binary format; the text blob, speaker labels and metadata are stored alongside
+COLUMNS = ("starts", "ends", "speaker_ids", "text_offsets", "word_offsets", "has_words",
+           "word_starts", "word_ends", "word_scores", "word_speaker_ids", "word_text_offsets")
+
+
+class Transcript(Mapping):
+    """
+    Columnar transcript: one NumPy array per field instead of one dict per segment/word.
+
+    Segments and words keep start/end as float32 seconds, speaker as an int16 index into
+    `speakers` (-1 for none) and their text as offsets into a single UTF-8 buffer. Word times
+    that were missing are NaN. `transcript["segments"]` is a lazy read-only view that yields
+    dict-like segments, so code written for `{"segments": [...], "language": ...}` keeps working;
+    `to_dict()` rebuilds the plain structure (e.g. for JSON). Unknown per-segment keys are dropped.
+    """
+
+    def __init__(self, starts, ends, speaker_ids, text, text_offsets, word_offsets, has_words,
+                 word_starts, word_ends, word_scores, word_speaker_ids, word_text_offsets,
+                 speakers: List[str], language: Optional[str] = None, extra: Optional[dict] = None):
+        self.starts = np.asarray(starts, dtype=np.float32)
+        self.ends = np.asarray(ends, dtype=np.float32)
+        self.speaker_ids = np.asarray(speaker_ids, dtype=np.int16)
+        self.text = text
+        self.text_offsets = np.asarray(text_offsets, dtype=np.int64)
+        self.word_offsets = np.asarray(word_offsets, dtype=np.int64)
+        self.has_words = np.asarray(has_words, dtype=bool)
+        self.word_starts = np.asarray(word_starts, dtype=np.float32)
+        self.word_ends = np.asarray(word_ends, dtype=np.float32)
+        self.word_scores = np.asarray(word_scores, dtype=np.float32)
+        self.word_speaker_ids = np.asarray(word_speaker_ids, dtype=np.int16)
+        self.word_text_offsets = np.asarray(word_text_offsets, dtype=np.int64)
+        self.speakers = list(speakers)
+        self.language = language
+        self.extra = dict(extra or {})
+
+    @classmethod
+    def from_dict(cls, result: dict) -> "Transcript":
+        segments = result.get("segments", [])
+        speakers = {}
+
+        def speaker_id(item):
+            if "speaker" not in item:
+                return NO_SPEAKER
+            return speakers.setdefault(item["speaker"], len(speakers))
+
+        buffer = bytearray()
+        starts, ends, speaker_ids, text_offsets, word_offsets, has_words = [], [], [], [0], [0], []
+        for seg in segments:
+            starts.append(seg["start"])
+            ends.append(seg["end"])
+            speaker_ids.append(speaker_id(seg))
+            buffer += seg.get("text", "").encode("utf-8")
+            text_offsets.append(len(buffer))
+            has_words.append("words" in seg)
+            word_offsets.append(word_offsets[-1] + len(seg.get("words", [])))
+
+        word_starts, word_ends, word_scores, word_speaker_ids, word_text_offsets = [], [], [], [], [len(buffer)]
+        for seg in segments:
+            for word in seg.get("words", []):
+                word_starts.append(word.get("start", np.nan))
+                word_ends.append(word.get("end", np.nan))
+                word_scores.append(word.get("score", np.nan))
+                word_speaker_ids.append(speaker_id(word))
+                buffer += word.get("word", "").encode("utf-8")
+                word_text_offsets.append(len(buffer))
+
+        extra = {k: v for k, v in result.items() if k not in ("segments", "language")}
+        return cls(starts, ends, speaker_ids, bytes(buffer), text_offsets, word_offsets, has_words,
+                   word_starts, word_ends, word_scores, word_speaker_ids, word_text_offsets,
+                   list(speakers), result.get("language"), extra)
+
+    def to_dict(self) -> dict:
+        result = {"segments": [seg.copy() for seg in self.segments], "language": self.language}
+        result.update(self.extra)
+        return result
+
+    def save(self, path: str):
+        """Write the binary format (uncompressed .npz, so it can be memory-mapped on load)"""
+        arrays = {name: getattr(self, name) for name in COLUMNS}
+        arrays["text"] = np.frombuffer(bytes(self.text), dtype=np.uint8)
+        arrays["speakers"] = np.array(self.speakers, dtype=str)
+        arrays["meta"] = np.array(json.dumps({"version": FORMAT_VERSION, "language": self.language,
+                                              "extra": self.extra}, ensure_ascii=False))
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path + ".tmp", "wb") as f:
+            np.savez(f, **arrays)
+        os.replace(path + ".tmp", path)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "Transcript":
+        """Read the binary format; with `mmap`, columns are memory-mapped rather than read"""
+        members = _mmap_npz(path) if mmap else None
+        with np.load(path) as data:
+            meta = json.loads(str(data["meta"]))
+            if meta.get("version", FORMAT_VERSION) > FORMAT_VERSION:
+                raise ValueError(f"{path} was written by a newer version (format {meta['version']})")
+            if members is None:
+                members = {name: data[name] for name in COLUMNS + ("text",)}
+            speakers = [str(label) for label in data["speakers"]]
+        return cls(text=members["text"], speakers=speakers, language=meta.get("language"), extra=meta.get("extra"),
+                   **{name: members[name] for name in COLUMNS})
+
+    # Mapping interface, so the transcript can be used where the result dict was used
+    def __getitem__(self, key):
+        if key == "segments":
+            return self.segments
+        if key == "language":
+            return self.language
+        return self.extra[key]
+
+    def __iter__(self):
+        yield "segments"
+        yield "language"
+        yield from self.extra
+
+    def __len__(self):
+        return 2 + len(self.extra)
+
+    def __setitem__(self, key, value):
+        if key == "language":
+            self.language = value
+        elif key == "segments":
+            raise TypeError("Transcript segments are read-only, build a new Transcript instead")
+        else:
+            self.extra[key] = value
+
+    @property
+    def segments(self) -> "_SegmentsView":
+        return _SegmentsView(self)
+
+    @property
+    def num_words(self) -> int:
+        return len(self.word_starts)
+
+    def segment_text(self, i: int) -> str:
+        # text is bytes, or a uint8 memmap when loaded from the binary format
+        return bytes(self.text[self.text_offsets[i]:self.text_offsets[i + 1]]).decode("utf-8")
+
+    def word_text(self, j: int) -> str:
+        return bytes(self.text[self.word_text_offsets[j]:self.word_text_offsets[j + 1]]).decode("utf-8")
+
+    def texts(self) -> List[str]:
+        return [self.segment_text(i) for i in range(len(self.starts))]
+
+    def speaker_label(self, speaker_id: int) -> Optional[str]:
+        return None if speaker_id == NO_SPEAKER else self.speakers[speaker_id]
+
+    def set_speakers(self, segment_labels, word_labels=None):
+        """Set speaker labels (None for no speaker) for all segments and, optionally, all words"""
+        labels = {label: i for i, label in enumerate(self.speakers)}
+
+        def to_ids(values):
+            return np.array([NO_SPEAKER if v is None else labels.setdefault(v, len(labels)) for v in values],
+                            dtype=np.int16)
+
+        self.speaker_ids = to_ids(segment_labels)
+        if word_labels is not None:
+            self.word_speaker_ids = to_ids(word_labels)
+        self.speakers = list(labels)
+
+    def rename_speakers(self, mapping: dict):
+        self.speakers = [mapping.get(label, label) for label in self.speakers]
+
+
+class _SegmentsView(Sequence):
+    __slots__ = ("_transcript",)
+
+    def __init__(self, transcript: Transcript):
+        self._transcript = transcript
+
+    def __len__(self):
+        return len(self._transcript.starts)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return [self[j] for j in range(*i.indices(len(self)))]
+        if i < 0:
+            i += len(self)
+        if not 0 <= i < len(self):
+            raise IndexError(i)
+        return _SegmentView(self._transcript, i)
+
+
+class _SegmentView(Mapping):
+    __slots__ = ("_transcript", "_i")
+
+    def __init__(self, transcript: Transcript, i: int):
+        self._transcript = transcript
+        self._i = i
+
+    def _keys(self):
+        t, i = self._transcript, self._i
+        keys = ["text", "start", "end"]
+        if t.speaker_ids[i] != NO_SPEAKER:
+            keys.append("speaker")
+        if t.has_words[i]:
+            keys.append("words")
+        return keys
+
+    def __getitem__(self, key):
+        t, i = self._transcript, self._i
+        if key == "text":
+            return t.segment_text(i)
+        if key == "start":
+            return round(float(t.starts[i]), 3)
+        if key == "end":
+            return round(float(t.ends[i]), 3)
+        if key == "speaker" and t.speaker_ids[i] != NO_SPEAKER:
+            return t.speakers[t.speaker_ids[i]]
+        if key == "words" and t.has_words[i]:
+            return [_WordView(t, j) for j in range(t.word_offsets[i], t.word_offsets[i + 1])]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def copy(self):
+        return {key: [dict(w) for w in value] if key == "words" else value for key, value in self.items()}
+
+
+class _WordView(Mapping):
+    __slots__ = ("_transcript", "_j")
+
+    def __init__(self, transcript: Transcript, j: int):
+        self._transcript = transcript
+        self._j = j
+
+    def _keys(self):
+        t, j = self._transcript, self._j
+        keys = ["word"]
+        keys += [key for key, column in (("start", t.word_starts), ("end", t.word_ends), ("score", t.word_scores))
+                 if not np.isnan(column[j])]
+        if t.word_speaker_ids[j] != NO_SPEAKER:
+            keys.append("speaker")
+        return keys
+
+    def __getitem__(self, key):
+        t, j = self._transcript, self._j
+        columns = {"start": t.word_starts, "end": t.word_ends, "score": t.word_scores}
+        if key == "word":
+            return t.word_text(j)
+        if key in columns and not np.isnan(columns[key][j]):
+            return round(float(columns[key][j]), 3)
+        if key == "speaker" and t.word_speaker_ids[j] != NO_SPEAKER:
+            return t.speakers[t.word_speaker_ids[j]]
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(self._keys())
+
+    def __len__(self):
+        return len(self._keys())
+
+    def copy(self):
+        return dict(self)
+
+
+def as_dict(result) -> dict:
+    """Return the plain result dict of a Transcript (or the result itself if it already is one)"""
+    return result.to_dict() if isinstance(result, Transcript) else result
+
+
+def _mmap_npz(path: str) -> dict:
+    """Memory-map the stored (uncompressed) .npy members of an .npz file"""
+    members = {}
+    with zipfile.ZipFile(path) as zf, open(path, "rb") as f:
+        for info in zf.infolist():
+            name = info.filename[:-len(".npy")]
+            if name not in COLUMNS and name != "text":
+                continue
+            if info.compress_type != zipfile.ZIP_STORED:
+                members[name] = np.load(zf.open(info))
+                continue
+            # skip the zip local file header to reach the .npy data
+            f.seek(info.header_offset + 26)
+            name_length, extra_length = struct.unpack("<HH", f.read(4))
+            f.seek(name_length + extra_length, os.SEEK_CUR)
+            version = np.lib.format.read_magic(f)
+            if version == (1, 0):
+                shape, fortran_order, dtype = np.lib.format.read_array_header_1_0(f)
+            else:
+                shape, fortran_order, dtype = np.lib.format.read_array_header_2_0(f)
+            if int(np.prod(shape)) == 0:
+                members[name] = np.empty(shape, dtype=dtype)
+            else:
+                members[name] = np.memmap(path, dtype=dtype, mode="r", offset=f.tell(), shape=shape,
+                                          order="F" if fortran_order else "C")
+    return members
+
+
+def npz_path(json_path: str) -> str:
+    """Path of the binary transcript stored next to a transcription JSON file"""
+    return os.path.splitext(json_path)[0] + ".npz"
+
+
+def save_transcript(result, path: str):
+    """Save a Transcript or result dict in the binary format"""
+    transcript = result if isinstance(result, Transcript) else Transcript.from_dict(result)
+    transcript.save(path)
+
+
+def load_transcript(path: str):
+    """Load a transcript from .npz (memory-mapped Transcript) or .json (result dict)"""
+    if path.endswith(".npz"):
+        return Transcript.load(path)
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def load_fresh_transcript(json_path: str) -> Optional[Transcript]:
+    """The binary copy of a transcription JSON file, if it exists and is not older than the JSON"""
+    path = npz_path(json_path)
+    if not os.path.isfile(path):
+        return None
+    if os.path.isfile(json_path) and os.path.getmtime(path) < os.path.getmtime(json_path):
+        return None
+    try:
+        return Transcript.load(path)
+    except Exception as e:
+        print(f"Error reading binary transcript {path}: {e}")
+        return None
+
+
+def _convert(path: str):
+    if path.endswith(".npz"):
+        output = os.path.splitext(path)[0] + ".json"
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(Transcript.load(path).to_dict(), f, ensure_ascii=False, indent=4)
+    else:
+        output = npz_path(path)
+        save_transcript(load_transcript(path), output)
+    print(f"{path} -> {output}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    convert = subparsers.add_parser("convert", help="convert .json <-> .npz (directories: every transcription*.json)")
+    convert.add_argument("paths", nargs="+")
+    export = subparsers.add_parser("export", help="write subtitles/text from a transcript")
+    export.add_argument("path")
+    export.add_argument("--format", default="srt", choices=["txt", "vtt", "srt", "tsv", "json", "all"])
+    export.add_argument("--output_dir", default=None)
+    args = parser.parse_args()
+
+    if args.command == "export":
+        from .utils import get_writer
+
+        writer = get_writer(args.format, args.output_dir or os.path.dirname(args.path) or ".")
+        writer(load_transcript(args.path), args.path,
+               {"max_line_width": None, "max_line_count": None, "highlight_words": False})
+        return
+
+    for path in args.paths:
+        if not os.path.isdir(path):
+            _convert(path)
+            continue
+        for root, _, files in os.walk(path):
+            for name in sorted(files):
+                if name.startswith("transcription") and name.endswith(".json"):
+                    _convert(os.path.join(root, name))
+
+
+if __name__ == "__main__":
+    main()
@@ -5,6 +5,8 @@ import sys
 import zlib
 from typing import Callable, Optional, TextIO
 
+from .transcript import as_dict
+
 LANGUAGES = {
     "en": "english",
     "zh": "chinese",
@@ -402,7 +404,7 @@ class WriteJSON(ResultWriter):
     extension: str = "json"
 
     def write_result(self, result: dict, file: TextIO, options: dict):
-        json.dump(result, file)
+        json.dump(as_dict(result), file)
 
 
 def get_writer(
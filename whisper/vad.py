@@ -1,6 +1,9 @@
 import hashlib
+import multiprocessing
 import os
 import urllib
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
 from typing import Callable, Optional, Text, Union
 
 import numpy as np
@@ -10,14 +13,87 @@ from pyannote.audio import Model
 from pyannote.audio.core.io import AudioFile
 from pyannote.audio.pipelines import VoiceActivityDetection
 from pyannote.audio.pipelines.utils import PipelineModel
-from pyannote.core import Annotation, Segment, SlidingWindowFeature
+from pyannote.core import Annotation, Segment, SlidingWindow, SlidingWindowFeature
 from tqdm import tqdm
 
 from .diarize import Segment as SegmentX
 
 VAD_SEGMENTATION_URL = "https://whisperx.s3.eu-west-2.amazonaws.com/model_weights/segmentation/0b5b3216d60a2d32fc086b47ea8c67589aaeb26b7e07fcbe620d6d0b83e209ea/pytorch_model.bin"
 
-def load_vad_model(device, vad_onset=0.500, vad_offset=0.363, use_auth_token=None, model_fp=None):
+SILERO_VAD_REPO = "snakers4/silero-vad:v4.0"
+SILERO_WINDOW_SAMPLES = 512
+
+@contextmanager
+def torch_num_threads(num_threads=None):
+    """Temporarily limit the number of intra-op threads used by torch."""
+    if not num_threads:
+        yield
+        return
+    previous = torch.get_num_threads()
+    torch.set_num_threads(int(num_threads))
+    try:
+        yield
+    finally:
+        torch.set_num_threads(previous)
+
+def vad_model_identity(vad_method, model_fp=None):
+    """Names the VAD checkpoint: the pinned download or hub tag, or a custom file with its size and mtime"""
+    if vad_method == "silero":
+        return SILERO_VAD_REPO
+    if model_fp is None:
+        return VAD_SEGMENTATION_URL.split('/')[-2]
+    try:
+        stat = os.stat(model_fp)
+        return f"{os.path.abspath(model_fp)}:{stat.st_size}:{int(stat.st_mtime)}"
+    except OSError:
+        return os.path.abspath(model_fp)
+
+def load_vad_model(device, vad_onset=0.500, vad_offset=0.363, use_auth_token=None, model_fp=None,
+                   vad_method="pyannote", vad_batch_size=32, vad_step=None, vad_num_threads=None,
+                   vad_num_workers=None, vad_window=600.0, vad_window_overlap=10.0, vad_cache_dir=None):
+    """
+    Load the voice activity segmentation model.
+
+    vad_method: "pyannote" (default) or "silero", a lighter model for CPU-only offline runs
+    vad_batch_size: number of sliding windows scored per forward pass (pyannote only)
+    vad_step: sliding window step in seconds, defaults to 10% of the window duration (pyannote only)
+    vad_num_threads: torch intra-op threads used while scoring, None keeps the torch default
+    vad_num_workers: if > 1 on CPU, long files are scored in overlapping windows by a process pool
+    vad_window / vad_window_overlap: window length and overlap in seconds for the process pool
+    vad_cache_dir: if given, raw VAD scores are stored there per audio and VAD settings and reused on reruns
+    """
+    if vad_cache_dir is not None:
+        vad_model = load_vad_model(device, vad_onset=vad_onset, vad_offset=vad_offset, use_auth_token=use_auth_token,
+                                   model_fp=model_fp, vad_method=vad_method, vad_batch_size=vad_batch_size,
+                                   vad_step=vad_step, vad_num_threads=vad_num_threads, vad_num_workers=vad_num_workers,
+                                   vad_window=vad_window, vad_window_overlap=vad_window_overlap)
+        # Scores depend on the checkpoint and, slightly, on windowed scoring, so both are part of the key
+        windowed = isinstance(vad_model, ParallelVoiceActivitySegmentation)
+        vad_params = {"method": vad_method, "model": vad_model_identity(vad_method, model_fp), "onset": vad_onset,
+                      "offset": vad_offset, "step": vad_step,
+                      "window": (vad_window, vad_window_overlap) if windowed else None}
+        return CachedVoiceActivitySegmentation(vad_model, vad_cache_dir, vad_params)
+
+    if vad_num_workers and vad_num_workers > 1 and torch.device(device).type == "cpu":
+        worker_kwargs = dict(
+            device="cpu", vad_onset=vad_onset, vad_offset=vad_offset, use_auth_token=use_auth_token,
+            model_fp=model_fp, vad_method=vad_method, vad_batch_size=vad_batch_size, vad_step=vad_step,
+            vad_num_threads=vad_num_threads or max(1, (os.cpu_count() or 1) // vad_num_workers),
+        )
+        in_process_kwargs = dict(worker_kwargs, vad_num_threads=vad_num_threads)
+        return ParallelVoiceActivitySegmentation(
+            load_vad_model(**in_process_kwargs),
+            worker_kwargs,
+            num_workers=vad_num_workers,
+            window=vad_window,
+            overlap=vad_window_overlap,
+        )
+
+    if vad_method == "silero":
+        return SileroVoiceActivitySegmentation(device=torch.device(device), num_threads=vad_num_threads)
+    if vad_method != "pyannote":
+        raise ValueError(f"Unknown VAD method: {vad_method}")
+
     model_dir = torch.hub._get_torch_home()
     os.makedirs(model_dir, exist_ok = True)
     if model_fp is None:
@@ -53,7 +129,11 @@ def load_vad_model(device, vad_onset=0.500, vad_offset=0.363, use_auth_token=Non
                     "offset": vad_offset,
                     "min_duration_on": 0.1,
                     "min_duration_off": 0.1}
-    vad_pipeline = VoiceActivitySegmentation(segmentation=vad_model, device=torch.device(device))
+    inference_kwargs = {"batch_size": vad_batch_size}
+    if vad_step is not None:
+        inference_kwargs["step"] = vad_step
+    vad_pipeline = VoiceActivitySegmentation(segmentation=vad_model, device=torch.device(device),
+                                             num_threads=vad_num_threads, **inference_kwargs)
     vad_pipeline.instantiate(hyperparameters)
 
     return vad_pipeline
@@ -200,10 +280,12 @@ class VoiceActivitySegmentation(VoiceActivityDetection):
         segmentation: PipelineModel = "pyannote/segmentation",
         fscore: bool = False,
         use_auth_token: Union[Text, None] = None,
+        num_threads: Optional[int] = None,
         **inference_kwargs,
     ):
 
         super().__init__(segmentation=segmentation, fscore=fscore, use_auth_token=use_auth_token, **inference_kwargs)
+        self.num_threads = num_threads
 
     def apply(self, file: AudioFile, hook: Optional[Callable] = None) -> Annotation:
         """Apply voice activity detection
@@ -234,11 +316,154 @@ class VoiceActivitySegmentation(VoiceActivityDetection):
                 segmentations = self._segmentation(file)
                 file[self.CACHED_SEGMENTATION] = segmentations
         else:
-            segmentations: SlidingWindowFeature = self._segmentation(file)
+            with torch_num_threads(self.num_threads):
+                segmentations: SlidingWindowFeature = self._segmentation(file)
 
         return segmentations
 
 
+class SileroVoiceActivitySegmentation:
+    """Frame-level speech probabilities from the silero VAD model (the one used by whisper_streaming).
+
+    Returns the same kind of SlidingWindowFeature as VoiceActivitySegmentation, so the
+    result goes through the same `merge_chunks` path.
+    """
+
+    def __init__(self, device: torch.device = torch.device("cpu"), num_threads: Optional[int] = None, sample_rate: int = 16000):
+        self.model, _ = torch.hub.load(repo_or_dir=SILERO_VAD_REPO, model="silero_vad")
+        self.model = self.model.to(device)
+        self.device = device
+        self.num_threads = num_threads
+        self.sample_rate = sample_rate
+
+    def __call__(self, file: AudioFile) -> SlidingWindowFeature:
+        waveform = file["waveform"].reshape(-1).to(self.device)
+        num_windows = -(-waveform.shape[0] // SILERO_WINDOW_SAMPLES)
+        waveform = torch.nn.functional.pad(waveform, (0, num_windows * SILERO_WINDOW_SAMPLES - waveform.shape[0]))
+        windows = waveform.reshape(num_windows, SILERO_WINDOW_SAMPLES)
+
+        scores = np.empty((num_windows, 1), dtype=np.float32)
+        with torch_num_threads(self.num_threads), torch.inference_mode():
+            self.model.reset_states()
+            for i in range(num_windows):
+                scores[i, 0] = self.model(windows[i:i + 1], self.sample_rate).item()
+
+        duration = SILERO_WINDOW_SAMPLES / self.sample_rate
+        return SlidingWindowFeature(scores, SlidingWindow(start=0.0, duration=duration, step=duration))
+
+
+def stitch_scores(windows, num_samples, sample_rate=16000):
+    """
+    Stitch the frame scores of overlapping audio windows into one timeline.
+
+    windows: list of (start_sample, SlidingWindowFeature) in the order of the audio
+    Frames are mapped onto the frame grid of the first window; where windows overlap,
+    their scores are averaged.
+    """
+    frames = windows[0][1].sliding_window
+    offset = windows[0][0] / sample_rate
+    grid = SlidingWindow(start=offset + frames.start, duration=frames.duration, step=frames.step)
+    num_frames = int(np.ceil((num_samples / sample_rate - grid.start) / grid.step)) + 1
+    num_classes = windows[0][1].data.shape[1]
+
+    total = np.zeros((num_frames, num_classes), dtype=np.float64)
+    count = np.zeros((num_frames, 1), dtype=np.int32)
+    for start_sample, scores in windows:
+        window_frames = scores.sliding_window
+        times = start_sample / sample_rate + window_frames.start + np.arange(scores.data.shape[0]) * window_frames.step
+        idx = np.rint((times - grid.start) / grid.step).astype(np.int64)
+        keep = (idx >= 0) & (idx < num_frames)
+        np.add.at(total, idx[keep], scores.data[keep])
+        np.add.at(count, idx[keep], 1)
+
+    last = np.flatnonzero(count[:, 0])[-1] + 1
+    data = (total[:last] / np.maximum(count[:last], 1)).astype(np.float32)
+    return SlidingWindowFeature(data, grid)
+
+_worker_vad_model = None
+
+def _init_vad_worker(vad_kwargs):
+    global _worker_vad_model
+    _worker_vad_model = load_vad_model(**vad_kwargs)
+
+def _score_vad_window(start_sample, audio, sample_rate):
+    scores = _worker_vad_model({"waveform": torch.from_numpy(audio).unsqueeze(0), "sample_rate": sample_rate})
+    return start_sample, scores
+
+
+class ParallelVoiceActivitySegmentation:
+    """Score long files in overlapping windows with a pool of VAD worker processes.
+
+    Files no longer than one window are scored in-process by `vad_model`. The stitched
+    scores are a SlidingWindowFeature, so they go through the same `merge_chunks` path.
+    """
+
+    def __init__(self, vad_model, worker_kwargs: dict, num_workers: int, window: float = 600.0, overlap: float = 10.0):
+        assert 0 <= overlap < window
+        self.vad_model = vad_model
+        self.worker_kwargs = worker_kwargs
+        self.num_workers = num_workers
+        self.window = window
+        self.overlap = overlap
+
+    def __call__(self, file: AudioFile) -> SlidingWindowFeature:
+        sample_rate = file["sample_rate"]
+        audio = file["waveform"].reshape(-1).numpy()
+        window = int(self.window * sample_rate)
+        hop = window - int(self.overlap * sample_rate)
+        if audio.shape[0] <= window:
+            return self.vad_model(file)
+
+        starts = list(range(0, audio.shape[0] - window + hop, hop))
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=min(self.num_workers, len(starts)), mp_context=context,
+                                 initializer=_init_vad_worker, initargs=(self.worker_kwargs,)) as pool:
+            futures = [pool.submit(_score_vad_window, s, audio[s:s + window], sample_rate) for s in starts]
+            windows = [f.result() for f in futures]
+
+        return stitch_scores(windows, audio.shape[0], sample_rate)
+
+
+class CachedVoiceActivitySegmentation:
+    """Reuse VAD scores of audio that has been segmented before.
+
+    Raw scores are stored as a compact .npz per (audio hash, VAD settings), so reruns with
+    another Whisper model or language skip VAD, and a different chunk_size only re-runs
+    `merge_chunks` on the cached scores.
+    """
+
+    def __init__(self, vad_model, cache_dir: str, vad_params: dict):
+        self.vad_model = vad_model
+        self.cache_dir = cache_dir
+        self.vad_params = vad_params
+
+    def cache_path(self, file: AudioFile) -> str:
+        # hash the tensor's buffer in place; tobytes() would copy the whole waveform
+        digest = hashlib.sha1(memoryview(np.ascontiguousarray(file["waveform"].numpy())))
+        digest.update(repr((file["sample_rate"], sorted(self.vad_params.items()))).encode("utf-8"))
+        return os.path.join(self.cache_dir, f"{digest.hexdigest()}.npz")
+
+    def __call__(self, file: AudioFile) -> SlidingWindowFeature:
+        cache_path = self.cache_path(file)
+        if os.path.isfile(cache_path):
+            try:
+                with np.load(cache_path) as cached:
+                    frames = SlidingWindow(start=float(cached["start"]), duration=float(cached["duration"]),
+                                           step=float(cached["step"]))
+                    return SlidingWindowFeature(cached["data"], frames)
+            except Exception as e:
+                print(f"Ignoring unreadable VAD cache {cache_path}: {e}")
+
+        scores = self.vad_model(file)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        frames = scores.sliding_window
+        with open(cache_path + ".tmp", "wb") as f:
+            np.savez_compressed(f, data=scores.data.astype(np.float32), start=frames.start,
+                                duration=frames.duration, step=frames.step)
+        os.replace(cache_path + ".tmp", cache_path)
+        return scores
+
+
 def merge_vad(vad_arr, pad_onset=0.0, pad_offset=0.0, min_duration_off=0.0, min_duration_on=0.0):
 
     active = Annotation()